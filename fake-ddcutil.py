@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""
+Stand-in for the ddcutil executable, simulating the Samsung S24B300 on bus 20
+Used by monitor-benchmark.py to exercise the server's ddcutil backend without a display
+
+Supports the subset of ddcutil the server uses:
+    fake-ddcutil.py getvcp <code>... --bus N [--brief]
+    fake-ddcutil.py setvcp <code> <value> [<code> <value>]... --bus N
+    fake-ddcutil.py capabilities --bus N [--verbose]
+
+Monitor state lives in a JSON file shared by every invocation. The simulated
+monitor is configured with the same environment variables as the server's
+fake I2C device:
+    MONITOR_FAKE_DDCUTIL_STATE  State file (default /tmp/fake_ddcutil_state.json)
+    MONITOR_FAKE_WAKE_DELAY     Seconds the monitor ignores DDC/CI after power-on
+    MONITOR_FAKE_NACK_RATE      Probability that a VCP transaction is NACKed; like
+                                ddcutil, a command retries up to MAX_TRIES times
+    MONITOR_FAKE_LATENCY        Seconds each VCP transaction takes
+"""
+
+import fcntl
+import json
+import os
+import random
+import sys
+import time
+
+STATE_FILE = os.environ.get("MONITOR_FAKE_DDCUTIL_STATE", "/tmp/fake_ddcutil_state.json")
+WAKE_DELAY = float(os.environ.get("MONITOR_FAKE_WAKE_DELAY", 0))
+NACK_RATE = float(os.environ.get("MONITOR_FAKE_NACK_RATE", 0))
+LATENCY = float(os.environ.get("MONITOR_FAKE_LATENCY", 0))
+
+MAX_TRIES = 4  # ddcutil's default tries for a VCP exchange before "Maximum retries exceeded"
+POWER_ON = 0x01
+
+# VCP code -> (type, default value, maximum); D6, 14, 60 and DC are simple non-continuous
+FEATURES = {
+    "d6": ("SNC", POWER_ON, 0x05),
+    "10": ("C", 50, 100),
+    "12": ("C", 75, 100),
+    "14": ("SNC", 0x02, 0x0b),
+    "16": ("C", 50, 100),
+    "18": ("C", 50, 100),
+    "1a": ("C", 50, 100),
+    "60": ("SNC", 0x03, 0x03),
+    "87": ("C", 50, 100),
+    "dc": ("SNC", 0x01, 0x06),
+}
+
+FEATURE_NAMES = {
+    "d6": "Power mode",
+    "10": "Brightness",
+    "12": "Contrast",
+    "14": "Select color preset",
+    "16": "Video gain: Red",
+    "18": "Video gain: Green",
+    "1a": "Video gain: Blue",
+    "60": "Input Source",
+    "87": "Sharpness",
+    "dc": "Display Mode",
+}
+
+# Same string as the server's FakeI2cDevice
+CAPABILITIES = (
+    "(prot(monitor)type(LCD)model(S24B300)cmds(01 02 03 07 0C E3 F3)"
+    "vcp(02 04 05 08 10 12 14(02 03 04 07 08 0B) 16 18 1A 60(01 03) 87 D6(01 04) DC(01 02 03 04 05 06) DF)"
+    "mswhql(1)mccs_ver(2.0))"
+)
+
+
+def load_state(f):
+    f.seek(0)
+    try:
+        state = json.load(f)
+    except ValueError:
+        state = {}
+    state.setdefault("values", {code: default for code, (_, default, _) in FEATURES.items()})
+    state.setdefault("waking_until", 0.0)
+    return state
+
+
+def save_state(f, state):
+    f.seek(0)
+    f.truncate()
+    json.dump(state, f)
+
+
+def fail(message):
+    print(message, file=sys.stderr)
+    sys.exit(1)
+
+
+def transaction(state):
+    """Simulate one VCP exchange on the bus, with ddcutil's retries of NACKed transactions"""
+    for _ in range(MAX_TRIES):
+        if LATENCY:
+            time.sleep(LATENCY)
+        if time.time() < state["waking_until"]:
+            fail("DDC communication failed for monitor on bus /dev/i2c-20")
+        if not NACK_RATE or random.random() >= NACK_RATE:
+            return
+    fail("Maximum retries exceeded")
+
+
+def getvcp(state, codes, brief):
+    for code in codes:
+        transaction(state)
+        if code not in FEATURES:
+            if brief:
+                print(f"VCP {code.upper()} ERR")
+            else:
+                print(f"VCP code 0x{code} (Unknown feature): Unsupported feature code")
+            continue
+
+        kind, _, maximum = FEATURES[code]
+        value = state["values"][code]
+        if brief:
+            if kind == "C":
+                print(f"VCP {code.upper()} C {value} {maximum}")
+            else:
+                print(f"VCP {code.upper()} SNC x{value:02x}")
+        else:
+            name = f"{FEATURE_NAMES[code]:<28}"
+            if kind == "C":
+                print(f"VCP code 0x{code} ({name}): current value = {value:5d}, max value = {maximum:5d}")
+            else:
+                print(f"VCP code 0x{code} ({name}): sl=0x{value:02x}")
+
+
+def setvcp(state, code, value):
+    transaction(state)
+    if code not in FEATURES:
+        fail(f"Feature {code} is not supported")
+    if code == "d6" and value == POWER_ON and state["values"][code] != POWER_ON:
+        state["waking_until"] = time.time() + WAKE_DELAY
+    state["values"][code] = value
+
+
+def capabilities(state, verbose):
+    # Reading the whole string takes several transactions on a real monitor
+    for _ in range(len(CAPABILITIES) // 32 + 1):
+        transaction(state)
+    if verbose:
+        print(f"Unparsed capabilities string: {CAPABILITIES}")
+    print("Model: S24B300")
+    print("MCCS version: 2.0")
+    print("VCP Features:")
+    for code, name in FEATURE_NAMES.items():
+        print(f"   Feature: {code.upper()} ({name})")
+
+
+def parse_value(text):
+    """Parse a setvcp value: decimal, or hex written as 0x.. or x.."""
+    try:
+        if text.startswith(("0x", "x")):
+            return int(text.split("x", 1)[1], 16)
+        return int(text)
+    except ValueError:
+        fail(f"Invalid value: {text}")
+
+
+def main():
+    args = sys.argv[1:]
+    brief = "--brief" in args
+    positional = []
+    i = 0
+    while i < len(args):
+        if args[i] == "--bus":
+            i += 2
+            continue
+        if not args[i].startswith("--"):
+            positional.append(args[i])
+        i += 1
+
+    if not positional or positional[0] not in ("getvcp", "setvcp", "capabilities"):
+        fail(f"Unsupported command: {' '.join(args)}")
+    command, operands = positional[0], [operand.lower() for operand in positional[1:]]
+
+    with open(STATE_FILE, "a+") as f:
+        # One process at a time owns the simulated bus, like ddcutil's bus lock
+        fcntl.flock(f, fcntl.LOCK_EX)
+        state = load_state(f)
+        if command == "capabilities":
+            capabilities(state, "--verbose" in args)
+        elif command == "getvcp":
+            if not operands:
+                fail("getvcp requires a feature code")
+            getvcp(state, operands, brief)
+        else:
+            if not operands or len(operands) % 2:
+                fail("setvcp requires feature code and value pairs")
+            for code, value in zip(operands[::2], operands[1::2]):
+                setvcp(state, code, parse_value(value))
+                save_state(f, state)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+"""
+Minimal in-memory MQTT 3.1.1 broker, for testing the monitor server's MQTT bridge
+Handles QoS 0/1 publishes, + and # wildcards, retained messages and last wills
+
+    ./fake-mqtt-broker.py --port 1883 --verbose
+    MONITOR_MQTT_HOST=127.0.0.1 MONITOR_DDC_BACKEND=fake ./monitor-http-server.py
+
+    # Send a command, or show what is retained
+    ./fake-mqtt-broker.py publish posterr_screen/brightness/set 40
+    ./fake-mqtt-broker.py retained
+"""
+
+import argparse
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 0x10, 0x20, 0x30, 0x40
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 0x80, 0x90, 0xA0, 0xB0
+PINGREQ, PINGRESP, DISCONNECT = 0xC0, 0xD0, 0xE0
+
+
+def encode_string(value):
+    encoded = value.encode() if isinstance(value, str) else value
+    return len(encoded).to_bytes(2, "big") + encoded
+
+
+def encode_packet(packet_type, body):
+    length = len(body)
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    return bytes([packet_type]) + bytes(encoded) + body
+
+
+def read_exact(sock, count):
+    data = b""
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return data
+
+
+def read_packet(sock):
+    first = read_exact(sock, 1)[0]
+    length, multiplier = 0, 1
+    while True:
+        byte = read_exact(sock, 1)[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    return first & 0xF0, first & 0x0F, read_exact(sock, length)
+
+
+def read_string(body, offset):
+    length = int.from_bytes(body[offset:offset + 2], "big")
+    return body[offset + 2:offset + 2 + length], offset + 2 + length
+
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter matching with + and #"""
+    pattern_parts, topic_parts = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class Broker:
+    """Subscriptions and retained messages shared by every connection"""
+
+    def __init__(self, verbose=False):
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.retained = {}  # topic -> payload
+        self.verbose = verbose
+
+    def route(self, topic, payload, retain):
+        if self.verbose:
+            print(f"{topic} {payload.decode(errors='replace')}{' (retained)' if retain else ''}", flush=True)
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            sessions = list(self.sessions)
+        for session in sessions:
+            if any(topic_matches(pattern, topic) for pattern in session.subscriptions):
+                session.send(PUBLISH, encode_string(topic) + payload)
+
+
+class Session(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.broker = self.server.broker
+        self.subscriptions = set()
+        self.send_lock = threading.Lock()
+        self.will = None
+
+    def send(self, packet_type, body):
+        try:
+            with self.send_lock:
+                self.request.sendall(encode_packet(packet_type, body))
+        except OSError:
+            pass
+
+    def handle(self):
+        clean = False
+        try:
+            packet_type, _, body = read_packet(self.request)
+            if packet_type != CONNECT:
+                return
+            self.connect(body)
+            with self.broker.lock:
+                self.broker.sessions.add(self)
+
+            while True:
+                packet_type, flags, body = read_packet(self.request)
+                if packet_type == PUBLISH:
+                    self.publish(flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    offset = 2
+                    while offset < len(body):
+                        pattern, offset = read_string(body, offset)
+                        self.subscriptions.discard(pattern.decode())
+                    self.send(UNSUBACK, body[:2])
+                elif packet_type == PINGREQ:
+                    self.send(PINGRESP, b"")
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.broker.lock:
+                self.broker.sessions.discard(self)
+            if not clean and self.will:
+                self.broker.route(*self.will)
+
+    def connect(self, body):
+        _, offset = read_string(body, 0)  # Protocol name
+        flags = body[offset + 1]
+        offset += 4  # Level, flags, keepalive
+        _, offset = read_string(body, offset)  # Client id
+        if flags & 0x04:
+            topic, offset = read_string(body, offset)
+            message, offset = read_string(body, offset)
+            self.will = (topic.decode(), message, bool(flags & 0x20))
+        self.send(CONNACK, b"\x00\x00")
+
+    def publish(self, flags, body):
+        topic, offset = read_string(body, 0)
+        qos = (flags >> 1) & 0x03
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            if qos == 1:
+                self.send(PUBACK, packet_id)
+        self.broker.route(topic.decode(), body[offset:], bool(flags & 0x01))
+
+    def subscribe(self, body):
+        packet_id, offset = body[:2], 2
+        patterns = []
+        while offset < len(body):
+            pattern, offset = read_string(body, offset)
+            offset += 1  # Requested QoS; everything is delivered at QoS 0
+            patterns.append(pattern.decode())
+        self.subscriptions.update(patterns)
+        self.send(SUBACK, packet_id + b"\x00" * len(patterns))
+
+        with self.broker.lock:
+            retained = list(self.broker.retained.items())
+        for topic, payload in retained:
+            if any(topic_matches(pattern, topic) for pattern in patterns):
+                self.send(PUBLISH | 0x01, encode_string(topic) + payload)
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def client_connect(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    body = encode_string("MQTT") + bytes([4, 0x02]) + (60).to_bytes(2, "big") + encode_string(f"cli-{time.time_ns()}")
+    sock.sendall(encode_packet(CONNECT, body))
+    read_packet(sock)
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=1883, help="Port to listen on (or connect to)")
+    parser.add_argument("--verbose", action="store_true", help="Print every published message")
+    subparsers = parser.add_subparsers(dest="command")
+    publish = subparsers.add_parser("publish", help="Publish one message to a running broker")
+    publish.add_argument("topic")
+    publish.add_argument("payload")
+    publish.add_argument("--retain", action="store_true")
+    subparsers.add_parser("retained", help="Print the retained messages of a running broker")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        sock = client_connect(args.port)
+        sock.sendall(encode_packet(PUBLISH | (0x01 if args.retain else 0),
+                                   encode_string(args.topic) + args.payload.encode()))
+        sock.sendall(encode_packet(DISCONNECT, b""))
+        sock.close()
+        return
+    if args.command == "retained":
+        sock = client_connect(args.port)
+        sock.sendall(encode_packet(SUBSCRIBE | 0x02, b"\x00\x01" + encode_string("#") + b"\x00"))
+        sock.settimeout(0.5)
+        try:
+            while True:
+                packet_type, _, body = read_packet(sock)
+                if packet_type == PUBLISH:
+                    topic, offset = read_string(body, 0)
+                    print(f"{topic.decode()} {body[offset:].decode(errors='replace')}")
+        except (socket.timeout, ConnectionError):
+            pass
+        sock.close()
+        return
+
+    server = Server(("127.0.0.1", args.port), Session)
+    server.broker = Broker(verbose=args.verbose)
+    print(f"Fake MQTT broker on 127.0.0.1:{args.port}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
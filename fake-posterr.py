@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""
+Stand-in for Posterr's /api/sleep endpoint, for testing the monitor server's sleep watcher
+Used by monitor-benchmark.py; can also be run by hand next to a test server
+
+    ./fake-posterr.py --port 9876 --flip-interval 60
+    MONITOR_POSTERR_URL=http://127.0.0.1:9876 MONITOR_DDC_BACKEND=fake ./monitor-http-server.py
+
+Control endpoints:
+    GET /control                    Current state and request/connection counts (JSON)
+    GET /control?sleep=true|false   Set the sleep state
+    GET /control?down=SECONDS       Answer /api/sleep with 503 for a while
+    GET /control?delay=SECONDS      Delay every /api/sleep answer
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePosterr:
+    """Sleep state and fault injection shared by all connections"""
+
+    def __init__(self, sleeping=False):
+        self.lock = threading.Lock()
+        self.sleeping = sleeping
+        self.down_until = 0.0
+        self.delay = 0.0
+        self.requests = 0
+        self.connections = 0
+        self.flips = 0
+
+    def flip(self):
+        with self.lock:
+            self.sleeping = not self.sleeping
+            self.flips += 1
+
+    def status(self):
+        with self.lock:
+            return {
+                "sleeping": self.sleeping,
+                "down": time.monotonic() < self.down_until,
+                "delay": self.delay,
+                "requests": self.requests,
+                "connections": self.connections,
+                "flips": self.flips,
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like Posterr's own server
+
+    def setup(self):
+        super().setup()
+        with self.server.posterr.lock:
+            self.server.posterr.connections += 1
+
+    def do_GET(self):
+        posterr = self.server.posterr
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/api/sleep":
+            with posterr.lock:
+                posterr.requests += 1
+                sleeping, down, delay = posterr.sleeping, time.monotonic() < posterr.down_until, posterr.delay
+            if delay:
+                time.sleep(delay)
+            if down:
+                self.reply(503, "Service Unavailable")
+            else:
+                self.reply(200, "true" if sleeping else "false")
+        elif url.path == "/control":
+            params = urllib.parse.parse_qs(url.query)
+            with posterr.lock:
+                if "sleep" in params:
+                    sleeping = params["sleep"][0].lower() == "true"
+                    if sleeping != posterr.sleeping:
+                        posterr.flips += 1
+                    posterr.sleeping = sleeping
+                if "down" in params:
+                    posterr.down_until = time.monotonic() + float(params["down"][0])
+                if "delay" in params:
+                    posterr.delay = float(params["delay"][0])
+            self.reply(200, json.dumps(posterr.status()), "application/json")
+        else:
+            self.reply(404, "Not Found")
+
+    def reply(self, status, body, content_type="text/plain"):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=9876, help="Port to listen on")
+    parser.add_argument("--sleeping", action="store_true", help="Start in sleep mode")
+    parser.add_argument("--flip-interval", type=float, default=0,
+                        help="Toggle the sleep state every this many seconds (0 = never)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    server.daemon_threads = True
+    server.posterr = FakePosterr(sleeping=args.sleeping)
+
+    if args.flip_interval:
+        def flipper():
+            while True:
+                time.sleep(args.flip_interval)
+                server.posterr.flip()
+        threading.Thread(target=flipper, daemon=True).start()
+
+    print(f"Fake Posterr on http://127.0.0.1:{args.port}/api/sleep")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
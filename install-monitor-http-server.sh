@@ -19,7 +19,11 @@ fi
 # Install Python3 and Flask
 echo "Installing dependencies..."
 sudo apt-get update
-sudo apt-get install -y python3 python3-pip python3-flask
+sudo apt-get install -y python3 python3-pip python3-flask python3-waitress
+# Optional: brotli-compressed web UI
+sudo apt-get install -y python3-brotli || echo "python3-brotli not available, web UI will be served gzip-compressed only"
+# Optional: MQTT bridge (Home Assistant / Node-RED)
+sudo apt-get install -y python3-paho-mqtt || echo "python3-paho-mqtt not available, the MQTT bridge will be disabled"
 
 # Copy server script to home directory
 echo "Installing monitor-http-server.py to /home/pi/..."
@@ -31,6 +35,12 @@ sudo chown pi:pi /home/pi/monitor-http-server.py
 echo "Installing systemd service..."
 sudo cp monitor-http-server.service /etc/systemd/system/monitor-http-server.service
 
+# The Posterr sleep watcher now runs inside the server; retire the old unit
+if [ -f /etc/systemd/system/posterr-sleepwatch.service ]; then
+    echo "Removing the old posterr-sleepwatch service (now built into the server)..."
+    ./uninstall-posterr-sleepwatch.sh || echo "Warning: could not remove posterr-sleepwatch, run uninstall-posterr-sleepwatch.sh"
+fi
+
 # Reload systemd and enable service
 echo "Enabling and starting service..."
 sudo systemctl daemon-reload
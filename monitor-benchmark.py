@@ -0,0 +1,935 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark and load-test harness for monitor-http-server.py
+Runs the server against a simulated monitor, so no display is needed
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(SCRIPT_DIR, "monitor-http-server.py")
+FAKE_DDCUTIL_SCRIPT = os.path.join(SCRIPT_DIR, "fake-ddcutil.py")
+FAKE_POSTERR_SCRIPT = os.path.join(SCRIPT_DIR, "fake-posterr.py")
+DEFAULT_PORT = 5099  # Away from the real server on 5000
+RESULTS_VERSION = 1  # Bump when the layout of saved results changes
+
+# Routes driven by the suite: (name, path or path(i), requests, clients).
+# None means the --requests/--clients default. path(i) may also return
+# (method, path, JSON body) for routes that are not GETs. {operation_id} is
+# filled in with a finished wake. Routes that change power state are covered
+# by the power-cycle scenario instead.
+SUITE_ROUTES = [
+    ("/", "/", None, None),
+    ("/health", "/health", None, None),
+    ("/status", "/status", None, None),
+    ("/status?fresh=1", "/status?fresh=1", None, None),
+    ("/brightness", "/brightness", None, None),
+    ("/brightness?fresh=1", "/brightness?fresh=1", None, None),
+    ("/brightness/<value>", lambda i: f"/brightness/{20 + i % 60}", None, None),
+    ("/batch", lambda i: ("POST", "/batch", {"steps": [{"code": "10", "value": 20 + i % 60},
+                                                      {"code": "12", "value": 50}, {"code": "10"}]}),
+     50, None),
+    ("/vcp", "/vcp", None, None),
+    ("/vcp/<code>", "/vcp/12", None, None),
+    ("/vcp/<code>/<value>", lambda i: ("POST", f"/vcp/12/{30 + i % 50}"), None, None),
+    ("/state", "/state", None, None),
+    ("/state?fresh=1", "/state?fresh=1", None, None),
+    ("/watchdog", "/watchdog", None, None),
+    ("/watchdog/log", "/watchdog/log", None, None),
+    ("/watchdog/log?lines=500", "/watchdog/log?lines=500", None, None),
+    ("/operations/<id>", "/operations/{operation_id}", None, None),
+    ("/wake/stats", "/wake/stats", None, None),
+    ("/sleepwatch", "/sleepwatch", None, None),
+    ("/metrics", "/metrics", None, None),
+    # Hung-up event streams are only noticed at the next keepalive, so stay
+    # within the server's EVENTS_MAX_CLIENTS
+    ("/events", "/events", 8, None),
+    ("/debug/profile", "/debug/profile?seconds=0.1", 5, 1),
+]
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors=0, duration=None):
+    """Latency summary in milliseconds"""
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "max_ms": None,
+    }
+    if latencies:
+        summary.update({
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        })
+    if duration:
+        summary["throughput_rps"] = round(len(latencies) / duration, 1)
+    return summary
+
+
+class Client:
+    """HTTP client that reuses its connection while the server allows, and reconnects otherwise"""
+
+    def __init__(self, port, timeout=60):
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def request(self, method, path, body=None):
+        """Return (status, seconds, parsed JSON or None); status is None on connection errors
+
+        body, if given, is sent as JSON.
+        """
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+            if body is None:
+                self.conn.request(method, path)
+            else:
+                self.conn.request(method, path, json.dumps(body), {"Content-Type": "application/json"})
+            response = self.conn.getresponse()
+            if response.getheader("Content-Type", "").startswith("text/event-stream"):
+                # Time to the first event, then hang up
+                response.fp.readline()
+                elapsed = time.perf_counter() - start
+                self.close()
+                return response.status, elapsed, None
+            body = response.read()
+            elapsed = time.perf_counter() - start
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            return response.status, elapsed, data
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return None, time.perf_counter() - start, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def start_server(port, state_dir, server_mode="waitress", env=None, backend="fake"):
+    """Start monitor-http-server.py on a simulated monitor and wait until it answers
+
+    backend "fake" uses the in-process fake I2C device; "ddcutil" runs the
+    ddcutil backend against fake-ddcutil.py.
+    """
+    server_env = dict(os.environ)
+    server_env.update({
+        "MONITOR_DDC_BACKEND": backend,
+        "MONITOR_HTTP_PORT": str(port),
+        "MONITOR_HTTP_SERVER": server_mode,
+        "MONITOR_STATE_DIR": state_dir,
+        "MONITOR_DDCUTIL": f"{shlex.quote(sys.executable)} {shlex.quote(FAKE_DDCUTIL_SCRIPT)}",
+        "MONITOR_FAKE_DDCUTIL_STATE": os.path.join(state_dir, "fake_ddcutil_state.json"),
+        "MONITOR_SLEEPWATCH": "0",  # Unless a fake Posterr is supplied
+    })
+    server_env.update(env or {})
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT], env=server_env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    client = Client(port, timeout=2)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        status, _, _ = client.get("/health")
+        if status == 200:
+            client.close()
+            return process
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start within 15 seconds")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def wait_for_operation(client, operation_id):
+    """Block until a background operation finishes; returns its final status"""
+    while True:
+        status, _, data = client.get(f"/operations/{operation_id}?wait=30")
+        if status != 200:
+            return "failed"
+        if data["operation"]["status"] != "running":
+            return data["operation"]["status"]
+
+
+def run_wake_load(args):
+    """Hammer /health and cached /status while the monitor is repeatedly woken"""
+    with tempfile.TemporaryDirectory() as state_dir:
+        process = start_server(
+            args.port, state_dir, args.server,
+            env={"MONITOR_FAKE_WAKE_DELAY": str(args.wake_delay)}
+        )
+        try:
+            # Warm the state cache so /status is served from memory
+            Client(args.port).get("/status")
+
+            stop = threading.Event()
+            lock = threading.Lock()
+            latencies = {"/health": [], "/status": []}
+            errors = {"/health": 0, "/status": 0}
+            wakes = []
+
+            def reader():
+                client = Client(args.port)
+                paths = list(latencies)
+                i = 0
+                while not stop.is_set():
+                    path = paths[i % len(paths)]
+                    i += 1
+                    status, elapsed, _ = client.get(path)
+                    with lock:
+                        if status == 200:
+                            latencies[path].append(elapsed)
+                        else:
+                            errors[path] += 1
+                client.close()
+
+            def waker():
+                client = Client(args.port)
+                while not stop.is_set():
+                    client.get("/off")
+                    start = time.perf_counter()
+                    status, _, data = client.get("/on")
+                    if status == 202:
+                        result = wait_for_operation(client, data["operation_id"])
+                    else:
+                        result = "succeeded" if status == 200 else "failed"
+                    wakes.append((time.perf_counter() - start, result))
+                client.close()
+
+            threads = [threading.Thread(target=reader) for _ in range(args.clients)]
+            threads.append(threading.Thread(target=waker))
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(args.duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            duration = time.perf_counter() - start
+        finally:
+            stop_server(process)
+
+    routes = {path: summarize(samples, errors[path], duration) for path, samples in latencies.items()}
+    routes["wake"] = summarize([w for w, result in wakes if result == "succeeded"],
+                               sum(1 for _, result in wakes if result != "succeeded"), duration)
+    results = {
+        "version": RESULTS_VERSION,
+        "mode": "wake-load",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "host": host_info(),
+        "config": {
+            "server": args.server,
+            "clients": args.clients,
+            "duration_s": round(duration, 1),
+            "wake_delay_s": args.wake_delay,
+        },
+        "backends": {"fake": routes},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+def process_resources(pid):
+    """RSS and peak RSS in KiB, open file descriptors and threads of a running process (Linux /proc)"""
+    resources = {"rss_kb": None, "peak_rss_kb": None, "fds": None, "threads": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    resources["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    resources["peak_rss_kb"] = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    resources["threads"] = int(line.split()[1])
+        resources["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        pass
+    return resources
+
+
+def slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, in value units per hour"""
+    points = [(x, y) for x, y in points if y is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return round(covariance / variance * 3600, 2)
+
+
+class SoakRecorder:
+    """Per-window latency and error tallies for each traffic class"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, kind, status, elapsed, ok=(200, 202)):
+        with self.lock:
+            if status in ok:
+                self.latencies.setdefault(kind, []).append(elapsed)
+            else:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+                self.latencies.setdefault(kind, [])
+
+    def take_window(self):
+        """Return and reset the tallies since the last call"""
+        with self.lock:
+            latencies, errors = self.latencies, self.errors
+            self.latencies, self.errors = {}, {}
+        return latencies, errors
+
+
+def homebridge_poller(port, recorder, stop, interval):
+    """Homebridge polls power and brightness on a schedule and sometimes dims"""
+    client = Client(port)
+    while not stop.wait(interval * random.uniform(0.9, 1.1)):
+        for path in ("/status", "/brightness"):
+            status, elapsed, _ = client.get(path)
+            recorder.record(f"homebridge {path}", status, elapsed)
+        if random.random() < 0.05:
+            # A dimming gesture in the Home app: a burst of brightness writes
+            target = random.randint(10, 100)
+            for value in range(max(10, target - 20), target + 1, 5):
+                status, elapsed, _ = client.get(f"/brightness/{value}")
+                recorder.record("homebridge /brightness/<value>", status, elapsed)
+    client.close()
+
+
+def browser_session(port, recorder, stop, interval):
+    """A control page left open: page load, an event stream, and the odd manual refresh"""
+    client = Client(port)
+    while not stop.is_set():
+        status, elapsed, _ = client.get("/")
+        recorder.record("browser /", status, elapsed, ok=(200, 304))
+        for path in ("/state?fresh=1", "/watchdog/log"):
+            status, elapsed, _ = client.get(path)
+            recorder.record(f"browser {path}", status, elapsed)
+
+        # Hold the event stream until it is time for the next refresh or reload
+        stream = None
+        start = time.perf_counter()
+        try:
+            stream = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            stream.request("GET", "/events")
+            response = stream.getresponse()
+            if response.status != 200:
+                recorder.record("browser /events", response.status, 0)
+                stop.wait(interval)
+                continue
+            response.fp.readline()
+            recorder.record("browser /events", 200, time.perf_counter() - start)
+            deadline = time.monotonic() + interval * random.uniform(0.5, 1.5)
+            while not stop.is_set() and time.monotonic() < deadline:
+                if not response.fp.readline():
+                    recorder.record("browser /events", None, 0)  # Dropped by the server
+                    break
+        except (OSError, http.client.HTTPException):
+            recorder.record("browser /events", None, time.perf_counter() - start)
+        finally:
+            if stream is not None:
+                stream.close()
+    client.close()
+
+
+def start_fake_posterr(port, flip_interval):
+    """Start fake-posterr.py, flipping its sleep state every flip_interval seconds"""
+    process = subprocess.Popen(
+        [sys.executable, FAKE_POSTERR_SCRIPT, "--port", str(port), "--flip-interval", str(flip_interval)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Fake Posterr did not start within 10 seconds")
+
+
+def run_soak(args):
+    """Replay production-shaped mixed traffic for hours, watching for slow degradation"""
+    env = {
+        "MONITOR_FAKE_WAKE_DELAY": str(args.wake_delay),
+        "MONITOR_FAKE_NACK_RATE": str(args.nack_rate),
+        "MONITOR_FAKE_LATENCY": str(args.latency),
+    }
+    windows = []
+    # The server's sleep watcher follows a fake Posterr that sleeps and wakes every --power-interval
+    posterr_port = args.port + 1
+    posterr = start_fake_posterr(posterr_port, args.power_interval)
+    env.update({
+        "MONITOR_SLEEPWATCH": "1",
+        "MONITOR_POSTERR_URL": f"http://127.0.0.1:{posterr_port}",
+    })
+    with tempfile.TemporaryDirectory() as state_dir:
+        log_path = os.path.join(state_dir, "wifi-watchdog.log")
+        write_watchdog_log(log_path, args.log_lines)
+        try:
+            process = start_server(args.port, state_dir, args.server,
+                                   env=dict(env, MONITOR_WATCHDOG_LOG=log_path), backend=args.backend)
+        except Exception:
+            stop_server(posterr)
+            raise
+        monitor = Client(args.port)
+        recorder = SoakRecorder()
+        stop = threading.Event()
+        threads = [threading.Thread(target=homebridge_poller,
+                                    args=(args.port, recorder, stop, args.homebridge_interval))
+                   for _ in range(args.homebridge)]
+        threads += [threading.Thread(target=browser_session,
+                                     args=(args.port, recorder, stop, args.browser_interval))
+                    for _ in range(args.browsers)]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            while time.perf_counter() - start < args.duration:
+                stop.wait(min(args.sample_interval, max(0, args.duration - (time.perf_counter() - start))))
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {process.returncode}")
+                latencies, errors = recorder.take_window()
+                window = {
+                    "elapsed_s": round(time.perf_counter() - start, 1),
+                    "resources": process_resources(process.pid),
+                    "routes": {kind: summarize(samples, errors.get(kind, 0))
+                               for kind, samples in sorted(latencies.items())},
+                }
+                _, _, data = monitor.get("/sleepwatch")
+                if data:
+                    window["sleepwatch"] = {key: data["sleepwatch"][key]
+                                            for key in ("polls", "poll_errors", "transitions")}
+                all_samples = [sample for samples in latencies.values() for sample in samples]
+                window["overall"] = summarize(all_samples, sum(errors.values()), args.sample_interval)
+                windows.append(window)
+                resources = window["resources"]
+                print(f"[{window['elapsed_s']:>8}s] requests={window['overall']['requests']} "
+                      f"errors={window['overall']['errors']} p99={window['overall']['p99_ms']}ms "
+                      f"rss={resources['rss_kb']}KiB fds={resources['fds']} threads={resources['threads']}",
+                      file=sys.stderr)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            monitor.close()
+            stop_server(process)
+            stop_server(posterr)
+
+    def trend(value):
+        return slope_per_hour([(w["elapsed_s"], value(w)) for w in windows])
+
+    total_requests = sum(w["overall"]["requests"] for w in windows)
+    total_errors = sum(w["overall"]["errors"] for w in windows)
+    results = {
+        "version": RESULTS_VERSION,
+        "mode": "soak",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "server": args.server,
+            "backend": args.backend,
+            "duration_s": args.duration,
+            "homebridge": args.homebridge,
+            "homebridge_interval_s": args.homebridge_interval,
+            "browsers": args.browsers,
+            "browser_interval_s": args.browser_interval,
+            "power_interval_s": args.power_interval,
+            "wake_delay_s": args.wake_delay,
+            "nack_rate": args.nack_rate,
+            "latency_s": args.latency,
+        },
+        "sleepwatch": windows[-1].get("sleepwatch") if windows else None,
+        "requests": total_requests,
+        "errors": total_errors,
+        "error_rate": round(total_errors / max(1, total_requests + total_errors), 5),
+        # Growth per hour of uptime; a healthy server stays near zero
+        "drift_per_hour": {
+            "p50_ms": trend(lambda w: w["overall"]["p50_ms"]),
+            "p99_ms": trend(lambda w: w["overall"]["p99_ms"]),
+            "rss_kb": trend(lambda w: w["resources"]["rss_kb"]),
+            "fds": trend(lambda w: w["resources"]["fds"]),
+            "threads": trend(lambda w: w["resources"]["threads"]),
+        },
+        "first_window": windows[0] if windows else None,
+        "last_window": windows[-1] if windows else None,
+        "windows": windows,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+def write_watchdog_log(path, lines):
+    """Synthetic wifi-watchdog log with the occasional restart"""
+    with open(path, "w") as f:
+        for i in range(lines):
+            stamp = f"2024-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+            if i % 500 == 499:
+                f.write(f"{stamp} - Network down, restarting WiFi\n")
+            else:
+                f.write(f"{stamp} - Network OK\n")
+
+
+def write_large_watchdog_log(path, size_mb):
+    """Synthetic watchdog log of about size_mb megabytes, one line a second, written a day at a time"""
+    day = []
+    for i in range(86400):
+        stamp = f"DATE {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+        if i % 500 == 499:
+            day.append(f"{stamp} - Network down, restarting WiFi\n")
+        else:
+            day.append(f"{stamp} - Network OK\n")
+    day = "".join(day)
+    size = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w") as f:
+        current = date(2024, 1, 1)
+        while written < size:
+            block = day.replace("DATE", current.isoformat())
+            f.write(block)
+            written += len(block)
+            current += timedelta(days=1)
+    return written
+
+
+def run_watchdog_log(args):
+    """Time watchdog log scanning, tailing and paging on a log of production-breaking size"""
+    routes = {}
+    with tempfile.TemporaryDirectory() as state_dir:
+        log_path = os.path.join(state_dir, "wifi-watchdog.log")
+        print(f"Writing a {args.size_mb} MB watchdog log", file=sys.stderr)
+        log_bytes = write_large_watchdog_log(log_path, args.size_mb)
+        process = start_server(args.port, state_dir, args.server, env={"MONITOR_WATCHDOG_LOG": log_path})
+        client = Client(args.port, timeout=600)
+        try:
+            # The first status read scans the whole file once; later ones only read what was appended
+            status, elapsed, _ = client.get("/watchdog")
+            routes["/watchdog (first scan)"] = summarize([elapsed] if status == 200 else [], int(status != 200))
+            after_scan = process_resources(process.pid)
+
+            latencies, errors = [], 0
+            for i in range(args.requests):
+                with open(log_path, "a") as f:
+                    for _ in range(args.append_lines):
+                        f.write(f"2099-01-01 00:00:{i % 60:02d} - Network OK\n")
+                status, elapsed, _ = client.get("/watchdog")
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+            routes["/watchdog (tail)"] = summarize(latencies, errors)
+
+            routes["/watchdog/log?lines=500"] = drive_route(
+                args.port, "/watchdog/log?lines=500", args.requests, 1
+            )
+
+            # Page back from the newest entries, following the returned cursor
+            latencies, errors, cursor = [], 0, None
+            for _ in range(args.pages):
+                path = "/watchdog/log?lines=500" + (f"&before={cursor}" if cursor is not None else "")
+                status, elapsed, data = client.get(path)
+                if status != 200:
+                    errors += 1
+                    break
+                latencies.append(elapsed)
+                cursor = data["cursor"]
+                if cursor is None:
+                    break
+            routes["/watchdog/log?before=<cursor>"] = summarize(latencies, errors)
+
+            # Jump straight to arbitrary depths, as a stale cursor would
+            routes["/watchdog/log?before=<random>"] = drive_route(
+                args.port, lambda i: f"/watchdog/log?lines=500&before={random.randrange(log_bytes)}",
+                args.requests, 1
+            )
+            end = process_resources(process.pid)
+        finally:
+            client.close()
+            stop_server(process)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "mode": "watchdog-log",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "host": host_info(),
+        "config": {
+            "server": args.server,
+            "log_bytes": log_bytes,
+            "requests": args.requests,
+            "pages": args.pages,
+            "append_lines": args.append_lines,
+        },
+        # Server memory should not grow with the size of the log. Memory freed
+        # after a scan hides in rss_kb, so peak_rss_kb is what to watch
+        "resources": {"after_first_scan": after_scan, "end": end},
+        "backends": {"fake": routes},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+def drive_route(port, path, requests, clients):
+    """Send `requests` requests split across `clients` concurrent clients"""
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    counter = iter(range(requests))
+
+    def worker():
+        client = Client(port)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            target = path(i) if callable(path) else path
+            if isinstance(target, tuple):
+                status, elapsed, _ = client.request(*target)
+            else:
+                status, elapsed, _ = client.get(target)
+            with lock:
+                if status in (200, 202):
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def finished_operation(port):
+    """Turn the simulated monitor off and on once; returns the id of the finished wake"""
+    client = Client(port)
+    client.get("/off")
+    status, _, data = client.get("/on")
+    if status != 202:
+        client.close()
+        raise RuntimeError(f"/on after /off returned {status}, not a background wake")
+    wait_for_operation(client, data["operation_id"])
+    client.close()
+    return data["operation_id"]
+
+
+def drive_power_cycles(port, cycles):
+    """Alternate /off and /on, following each wake through /operations/<id>"""
+    client = Client(port)
+    latencies = {"/off": [], "/on": [], "/operations/<id>": []}
+    errors = {path: 0 for path in latencies}
+    wakes = []
+    start = time.perf_counter()
+    for _ in range(cycles):
+        status, elapsed, _ = client.get("/off")
+        if status == 200:
+            latencies["/off"].append(elapsed)
+        else:
+            errors["/off"] += 1
+
+        wake_start = time.perf_counter()
+        status, elapsed, data = client.get("/on")
+        if status not in (200, 202):
+            errors["/on"] += 1
+            continue
+        latencies["/on"].append(elapsed)
+        if status == 202:
+            while True:
+                status, elapsed, data = client.get(f"/operations/{data['operation_id']}?wait=30")
+                if status != 200:
+                    errors["/operations/<id>"] += 1
+                    break
+                latencies["/operations/<id>"].append(elapsed)
+                if data["operation"]["status"] != "running":
+                    break
+        wakes.append(time.perf_counter() - wake_start)
+    duration = time.perf_counter() - start
+    client.close()
+
+    results = {path: summarize(samples, errors[path], duration) for path, samples in latencies.items()}
+    results["wake"] = summarize(wakes, 0, duration)
+    return results
+
+
+def run_suite(args):
+    """Drive every route against each simulated backend"""
+    env = {
+        "MONITOR_FAKE_WAKE_DELAY": str(args.wake_delay),
+        "MONITOR_FAKE_NACK_RATE": str(args.nack_rate),
+        "MONITOR_FAKE_LATENCY": str(args.latency),
+        "MONITOR_PROFILER": "1",
+    }
+    routes = [route for route in SUITE_ROUTES if not args.routes or route[0] in args.routes]
+    results = {
+        "version": RESULTS_VERSION,
+        "mode": "suite",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "host": host_info(),
+        "config": {
+            "server": args.server,
+            "requests": args.requests,
+            "clients": args.clients,
+            "cycles": args.cycles,
+            "wake_delay_s": args.wake_delay,
+            "nack_rate": args.nack_rate,
+            "latency_s": args.latency,
+            "watchdog_log_lines": args.log_lines,
+        },
+        "backends": {},
+    }
+
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as state_dir:
+            log_path = os.path.join(state_dir, "wifi-watchdog.log")
+            write_watchdog_log(log_path, args.log_lines)
+            process = start_server(args.port, state_dir, args.server,
+                                   env=dict(env, MONITOR_WATCHDOG_LOG=log_path), backend=backend)
+            try:
+                backend_results = {}
+                fixtures = {}
+                if any("{operation_id}" in path for _, path, _, _ in routes if isinstance(path, str)):
+                    fixtures["operation_id"] = finished_operation(args.port)
+                for name, path, requests, clients in routes:
+                    if isinstance(path, str):
+                        path = path.format(**fixtures)
+                    print(f"{backend}: {name}", file=sys.stderr)
+                    backend_results[name] = drive_route(
+                        args.port, path, requests or args.requests, clients or args.clients
+                    )
+                if args.cycles and (not args.routes or "power-cycle" in args.routes):
+                    print(f"{backend}: power-cycle", file=sys.stderr)
+                    for name, summary in drive_power_cycles(args.port, args.cycles).items():
+                        backend_results[f"power-cycle {name}"] = summary
+            finally:
+                stop_server(process)
+        results["backends"][backend] = backend_results
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+def host_info():
+    return {"hostname": socket.gethostname(), "python": platform.python_version(), "machine": platform.machine()}
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "-C", SCRIPT_DIR, "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, timeout=5)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare_results(args):
+    """Compare two saved suite results; returns (report, regressed)"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    report = {
+        "baseline": baseline.get("git_commit"),
+        "candidate": candidate.get("git_commit"),
+        "threshold_pct": args.threshold,
+        "regressions": [],
+        "routes": {},
+    }
+    for backend, routes in candidate["backends"].items():
+        for name, summary in routes.items():
+            before = baseline["backends"].get(backend, {}).get(name)
+            if not before:
+                continue
+            changes = {}
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                old, new = before.get(metric), summary.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old * 100
+                changes[metric] = {"baseline": old, "candidate": new, "change_pct": round(change, 1)}
+                # Sub-millisecond jitter is noise, not a regression
+                if change > args.threshold and new - old > args.min_delta_ms:
+                    report["regressions"].append(f"{backend} {name} {metric}: {old} -> {new} ms")
+            if summary.get("errors", 0) > before.get("errors", 0):
+                report["regressions"].append(
+                    f"{backend} {name} errors: {before.get('errors', 0)} -> {summary['errors']}"
+                )
+            report["routes"][f"{backend} {name}"] = changes
+
+    # Modes that watch the server's memory (watchdog-log) also compare its peak
+    old = (baseline.get("resources") or {}).get("end", {}).get("peak_rss_kb")
+    new = (candidate.get("resources") or {}).get("end", {}).get("peak_rss_kb")
+    if old and new is not None:
+        change = (new - old) / old * 100
+        report["peak_rss_kb"] = {"baseline": old, "candidate": new, "change_pct": round(change, 1)}
+        if change > args.threshold:
+            report["regressions"].append(f"peak RSS: {old} -> {new} KiB")
+    return report, bool(report["regressions"])
+
+
+def print_results(results):
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port for the server under test")
+    parser.add_argument("--server", choices=["waitress", "flask"], default="waitress",
+                        help="Serving mode of the server under test")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    wake_load = subparsers.add_parser(
+        "wake-load", help="Measure /health and cached /status latency during slow wakes"
+    )
+    wake_load.add_argument("--clients", type=int, default=8, help="Concurrent readers")
+    wake_load.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    wake_load.add_argument("--wake-delay", type=float, default=5.0,
+                           help="Seconds the simulated monitor ignores DDC/CI after power-on")
+    wake_load.add_argument("--output", help="Save results as JSON to this file")
+
+    suite = subparsers.add_parser(
+        "suite", help="Drive every route against the fake I2C device and fake ddcutil"
+    )
+    suite.add_argument("--backends", nargs="+", choices=["fake", "ddcutil"], default=["fake", "ddcutil"],
+                       help="DDC backends to run against")
+    suite.add_argument("--routes", nargs="+", help="Only these routes (names as in the results, or power-cycle)")
+    suite.add_argument("--requests", type=int, default=200, help="Requests per route")
+    suite.add_argument("--clients", type=int, default=4, help="Concurrent clients per route")
+    suite.add_argument("--cycles", type=int, default=5, help="Off/on cycles in the power-cycle scenario")
+    suite.add_argument("--wake-delay", type=float, default=1.0,
+                       help="Seconds the simulated monitor ignores DDC/CI after power-on")
+    suite.add_argument("--nack-rate", type=float, default=0.0,
+                       help="Probability that a simulated DDC transaction is NACKed")
+    suite.add_argument("--latency", type=float, default=0.0,
+                       help="Extra seconds each simulated DDC transaction takes")
+    suite.add_argument("--log-lines", type=int, default=100000, help="Lines in the synthetic watchdog log")
+    suite.add_argument("--output", help="Save results as JSON to this file")
+
+    soak = subparsers.add_parser(
+        "soak", help="Replay Homebridge, browser and sleep-watcher traffic for hours"
+    )
+    soak.add_argument("--backend", choices=["fake", "ddcutil"], default="fake", help="DDC backend to run against")
+    soak.add_argument("--duration", type=float, default=4 * 3600, help="Seconds to run")
+    soak.add_argument("--sample-interval", type=float, default=60,
+                      help="Seconds per reported window of latency, errors, RSS and FDs")
+    soak.add_argument("--homebridge", type=int, default=2, help="Homebridge accessories polling the server")
+    soak.add_argument("--homebridge-interval", type=float, default=5, help="Seconds between Homebridge polls")
+    soak.add_argument("--browsers", type=int, default=3, help="Control pages left open")
+    soak.add_argument("--browser-interval", type=float, default=120,
+                      help="Average seconds a page keeps its event stream before refreshing")
+    soak.add_argument("--power-interval", type=float, default=300,
+                      help="Seconds between the fake Posterr's sleep/wake changes (uses --port + 1)")
+    soak.add_argument("--wake-delay", type=float, default=5.0,
+                      help="Seconds the simulated monitor ignores DDC/CI after power-on")
+    soak.add_argument("--nack-rate", type=float, default=0.0,
+                      help="Probability that a simulated DDC transaction is NACKed")
+    soak.add_argument("--latency", type=float, default=0.0,
+                      help="Extra seconds each simulated DDC transaction takes")
+    soak.add_argument("--log-lines", type=int, default=10000, help="Lines in the synthetic watchdog log")
+    soak.add_argument("--output", help="Save results as JSON to this file")
+
+    watchdog_log = subparsers.add_parser(
+        "watchdog-log", help="Time /watchdog and /watchdog/log paging on a very large log"
+    )
+    watchdog_log.add_argument("--size-mb", type=int, default=300, help="Size of the synthetic watchdog log")
+    watchdog_log.add_argument("--requests", type=int, default=50, help="Requests per measurement")
+    watchdog_log.add_argument("--pages", type=int, default=200, help="Pages of 500 lines to follow back by cursor")
+    watchdog_log.add_argument("--append-lines", type=int, default=10,
+                              help="Lines appended to the log before each tailing /watchdog read")
+    watchdog_log.add_argument("--output", help="Save results as JSON to this file")
+
+    compare = subparsers.add_parser("compare", help="Compare two saved results")
+    compare.add_argument("baseline", help="Results from the known-good version")
+    compare.add_argument("candidate", help="Results from the version under test")
+    compare.add_argument("--threshold", type=float, default=20,
+                         help="Percent slowdown in p50/p95/p99 that counts as a regression")
+    compare.add_argument("--min-delta-ms", type=float, default=1.0,
+                         help="Ignore slowdowns smaller than this many milliseconds")
+
+    args = parser.parse_args()
+    if args.mode == "wake-load":
+        print_results(run_wake_load(args))
+    elif args.mode == "suite":
+        print_results(run_suite(args))
+    elif args.mode == "soak":
+        results = run_soak(args)
+        results.pop("windows")  # Kept in --output; too long for the terminal
+        print_results(results)
+    elif args.mode == "watchdog-log":
+        print_results(run_watchdog_log(args))
+    elif args.mode == "compare":
+        report, regressed = compare_results(args)
+        print_results(report)
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,24 +5,239 @@ Lightweight HTTP server for controlling Samsung monitor via DDC/CI
 Exposes REST API endpoints for HomeKit integration via Homebridge
 """
 
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, g, has_request_context, jsonify, render_template_string, request
 import subprocess
 import re
 import os
 import time
+import fcntl
+import heapq
+import itertools
+import threading
+import collections
+import json
+import uuid
+import gzip
+import hashlib
+import queue
+import signal
+import bisect
+import http.client
+import urllib.parse
+import random
+import contextlib
+import errno
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli  # Optional: python3-brotli adds a br-encoded variant of the web UI
+except ImportError:
+    brotli = None
+try:
+    import waitress  # python3-waitress, the production HTTP server
+except ImportError:
+    waitress = None
+try:
+    import paho.mqtt.client as paho_mqtt  # Optional: python3-paho-mqtt enables the MQTT bridge
+except ImportError:
+    paho_mqtt = None
 
 app = Flask(__name__)
 
 # Configuration
+# Where the server keeps its state; the systemd unit's StateDirectory= makes
+# this /var/lib/monitor-http-server, which survives reboots
+STATE_DIR = os.environ.get(
+    "MONITOR_STATE_DIR",
+    os.environ.get("STATE_DIRECTORY", os.path.expanduser("~/.local/state/monitor-http-server"))
+)
 DDC_BUS = "20"
 DDC_FEATURE_POWER = "d6"
 DDC_FEATURE_BRIGHTNESS = "10"
-MONITOR_ON_SCRIPT = "/home/pi/monitor-on.sh"
-MONITOR_OFF_SCRIPT = "/home/pi/monitor-off.sh"
-WATCHDOG_LOG = "/var/log/wifi-watchdog.log"
-BRIGHTNESS_STATE_FILE = "/tmp/monitor_last_brightness.txt"
+WATCHDOG_LOG = os.environ.get("MONITOR_WATCHDOG_LOG", "/var/log/wifi-watchdog.log")
+WATCHDOG_STATE_FILE = os.path.join(STATE_DIR, "monitor_watchdog_tail.json")  # Saved log offset and counters
+WATCHDOG_LOG_MAX_LINES = 500  # Most lines /watchdog/log returns per page
+WATCHDOG_BLOCK_SIZE = 8192  # Block size for reading the log backwards
+WATCHDOG_SCAN_BLOCK_SIZE = 65536  # Block size for scanning appended log lines
+WATCHDOG_HEAD_BYTES = 64  # Leading bytes compared to detect a replaced log file
+STATE_JOURNAL_FILE = os.path.join(STATE_DIR, "monitor_state.journal")  # Power and brightness history
+STATE_JOURNAL_FSYNC_INTERVAL = 5  # Seconds; changes within this window share one fsync
+STATE_JOURNAL_COMPACT_ENTRIES = 1000  # Journal lines before it is rewritten to the latest values
+LEGACY_BRIGHTNESS_STATE_FILE = "/tmp/monitor_last_brightness.txt"  # Imported once into the journal
 DEFAULT_BRIGHTNESS = 50  # Default brightness when no previous state exists
+DDC_POWER_ON = 0x01   # D6 value for "DPM: On"
+DDC_POWER_OFF = 0x04  # D6 value for "DPM: Off"
+
+# DDC/CI transport: "native" talks to /dev/i2c-<bus> in-process and falls back
+# to "ddcutil" if the device cannot be opened; "fake" simulates a monitor
+DDC_BACKEND = os.environ.get("MONITOR_DDC_BACKEND", "native")
+DDCUTIL_COMMAND = os.environ.get("MONITOR_DDCUTIL", "sudo ddcutil")  # fake-ddcutil.py stands in for benchmarks
+
+# DDC/CI protocol constants (VESA DDC/CI 1.1)
+I2C_SLAVE = 0x0703              # ioctl to select the target address on an i2c-dev fd
+DDC_CI_ADDRESS = 0x37           # 7-bit I2C address of the monitor's DDC/CI controller
+DDC_HOST_ADDRESS = 0x51         # Source address byte sent by the host
+DDC_WRITE_CHECKSUM_SEED = 0x6E  # Destination address (0x37 << 1) folded into request checksums
+DDC_READ_CHECKSUM_SEED = 0x50   # Virtual host address folded into reply checksums
+DDC_OP_GET_VCP = 0x01
+DDC_OP_GET_VCP_REPLY = 0x02
+DDC_OP_SET_VCP = 0x03
+DDC_GET_VCP_REPLY_LENGTH = 11   # Bytes in a Get VCP Feature reply, including checksum
+DDC_REPLY_DELAY = 0.04          # Seconds between a Get VCP request and reading its reply
+DDC_MESSAGE_DELAY = 0.05        # Minimum seconds between consecutive DDC/CI messages
+DDC_OP_CAPABILITIES = 0xF3
+DDC_OP_CAPABILITIES_REPLY = 0xE3
+DDC_CAPABILITIES_REPLY_LENGTH = 38  # Header, opcode, offset, up to 32 data bytes, checksum
+DDC_CAPABILITIES_MAX_LENGTH = 4096  # Give up on a capabilities string longer than this
+
+# Bus worker queue: lower numbers run first
+DDC_PRIORITY_POWER = 0
+DDC_PRIORITY_WRITE = 1
+DDC_PRIORITY_READ = 2
+DDC_JOB_TIMEOUT = 30  # Seconds a request waits for its queued VCP operation
+
+# DDC failures are classed as nack, busy, timeout or missing. NACKs and busy
+# replies are transient: the native backend retries each transaction with
+# jittered backoff (ddcutil does its own retries, so nothing is added on top).
+# After enough consecutive failures the circuit breaker fails operations fast
+# (requests get the last known state) until a half-open probe finds the
+# monitor again
+DDC_RETRY_KINDS = ("nack", "busy")
+DDC_RETRY_ATTEMPTS = 3  # Tries per transaction for transient failures
+DDC_RETRY_BACKOFF = 0.1  # Seconds before the first retry, doubling, +-50% jitter
+DDC_BREAKER_THRESHOLD = 3  # Consecutive failed operations that open the breaker
+DDC_BREAKER_COOLDOWN = 15  # Seconds open before a half-open probe; doubles while probes fail
+DDC_BREAKER_MAX_COOLDOWN = 120
+
+# Monitor state written by this server is trusted for this long before
+# /status and /brightness go back to the bus (override per request with ?fresh=1)
+STATE_CACHE_TTL = 60
+
+# /on and wake-from-zero brightness run in the background and return 202
+BRIGHTNESS_CONFIRM_READBACK = False  # Re-read brightness after every write (or per request with ?confirm=1)
+WAKE_TIMEOUT = 15.0  # Give up probing and restore brightness anyway after this long
+WAKE_PROBE_MIN_DELAY = 0.5  # Earliest first readiness probe after the power-on command
+WAKE_PROBE_INTERVAL = 0.25  # Initial gap between readiness probes (doubles on failure)
+WAKE_PROBE_MAX_INTERVAL = 1.0
+WAKE_STABLE_PROBES = 2  # Consecutive good probes before the monitor counts as awake
+WAKE_HISTORY = 50  # Wake latency samples kept for the learned distribution
+WAKE_MIN_SAMPLES = 5  # Samples needed before the distribution drives the probe schedule
+WAKE_STATS_FILE = os.path.join(STATE_DIR, "monitor_wake_latency.json")
+OPERATION_HISTORY = 50  # Finished operations kept for polling
+OPERATION_MAX_WAIT = 30  # Longest ?wait= accepted by /operations/<id>
+
+# HTTP serving: "waitress" is the production server (HTTP/1.1 keep-alive,
+# fixed worker pool, graceful shutdown); "flask" is the development server
+HTTP_SERVER = os.environ.get("MONITOR_HTTP_SERVER", "waitress")
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = int(os.environ.get("MONITOR_HTTP_PORT", 5000))
+HTTP_THREADS = 16  # Worker threads; each open /events stream holds one
+# Seconds a connection may sit with no request in progress and no data moving
+# before waitress closes it. Reading requests and sending responses happen on
+# waitress's event loop, so slow or idle clients never hold a worker thread.
+# Handlers bound their own waits (DDC_JOB_TIMEOUT, OPERATION_MAX_WAIT and the
+# subprocess timeouts).
+HTTP_IDLE_TIMEOUT = 30
+HTTP_SHUTDOWN_GRACE = 10  # Seconds to let in-flight requests finish on SIGTERM
+
+# Server-Sent Events (/events)
+EVENTS_REFRESH_INTERVAL = 5  # Seconds between background watchdog/state checks while clients listen
+EVENTS_KEEPALIVE = 15  # Seconds between keep-alive comments on an idle stream
+EVENTS_BACKLOG = 100  # Undelivered events per client before it is dropped
+EVENTS_MAX_CLIENTS = 8  # Leaves most HTTP worker threads free for API requests
+
+# Posterr sleep watcher: turns the monitor off while Posterr's sleep schedule
+# is active and back on when it ends (replaces posterr-sleepwatch.sh)
+POSTERR_URL = os.environ.get("MONITOR_POSTERR_URL", "http://192.168.20.10:9876")
+SLEEPWATCH_ENABLED = os.environ.get("MONITOR_SLEEPWATCH", "1") == "1"
+SLEEPWATCH_INTERVAL = float(os.environ.get("MONITOR_SLEEPWATCH_INTERVAL", 5))  # Seconds between polls
+SLEEPWATCH_JITTER = 0.2  # Each poll interval is moved randomly by up to this fraction
+SLEEPWATCH_MAX_BACKOFF = 60  # Longest seconds between polls while Posterr is unreachable
+SLEEPWATCH_TIMEOUT = 5  # Seconds to wait for Posterr to answer
+# Hysteresis: a new sleep state must be reported this many polls in a row AND
+# persist this many seconds before the monitor follows it (1 and 0 disable).
+# Turning off is cheap to delay; turning back on costs a full wake.
+SLEEPWATCH_OFF_SAMPLES = int(os.environ.get("MONITOR_SLEEPWATCH_OFF_SAMPLES", 3))
+SLEEPWATCH_OFF_DWELL = float(os.environ.get("MONITOR_SLEEPWATCH_OFF_DWELL", 15))
+SLEEPWATCH_ON_SAMPLES = int(os.environ.get("MONITOR_SLEEPWATCH_ON_SAMPLES", 2))
+SLEEPWATCH_ON_DWELL = float(os.environ.get("MONITOR_SLEEPWATCH_ON_DWELL", 0))
+
+# MQTT bridge for Home Assistant / Homebridge (disabled unless a broker is set)
+MQTT_HOST = os.environ.get("MONITOR_MQTT_HOST", "")
+MQTT_PORT = int(os.environ.get("MONITOR_MQTT_PORT", 1883))
+MQTT_USERNAME = os.environ.get("MONITOR_MQTT_USERNAME")
+MQTT_PASSWORD = os.environ.get("MONITOR_MQTT_PASSWORD")
+MQTT_TOPIC_PREFIX = os.environ.get("MONITOR_MQTT_PREFIX", "posterr_screen")
+MQTT_DISCOVERY_PREFIX = "homeassistant"  # Home Assistant's default discovery prefix
+MQTT_KEEPALIVE = 60  # Seconds; paho pings the broker when the link has been quiet this long
+MQTT_RECONNECT_MIN = 1  # First reconnect delay in seconds, doubling per failure
+MQTT_RECONNECT_MAX = 60
+MQTT_OFFLINE_BUFFER = 100  # Outgoing messages kept while disconnected; oldest dropped first
+
+# Outbound webhooks: POST state changes to each URL in MONITOR_WEBHOOK_URLS
+# (comma-separated) as {"events": [...]}, batched and retried in the background
+WEBHOOK_URLS = [url.strip() for url in os.environ.get("MONITOR_WEBHOOK_URLS", "").split(",") if url.strip()]
+WEBHOOK_EVENTS = set(os.environ.get("MONITOR_WEBHOOK_EVENTS", "power,brightness,watchdog_restart").split(","))
+WEBHOOK_BATCH_WINDOW = 0.5  # Seconds to collect events that happen close together into one POST
+WEBHOOK_BATCH_MAX = 50  # Events per POST
+WEBHOOK_QUEUE_SIZE = 500  # Undelivered events per receiver; oldest dropped first
+WEBHOOK_MAX_ATTEMPTS = 5  # Deliveries of one batch before it is given up
+WEBHOOK_RETRY_MIN = 1  # First retry delay in seconds, doubling per attempt
+WEBHOOK_RETRY_MAX = 30
+WEBHOOK_TIMEOUT = 5  # Seconds to wait for a receiver to answer
+
+# Diagnostics: per-phase Server-Timing header on every response (near-free),
+# and the /debug/profile sampling profiler (off unless MONITOR_PROFILER=1)
+SERVER_TIMING = True
+PROFILER_ENABLED = os.environ.get("MONITOR_PROFILER", "0") == "1"
+PROFILER_MAX_SECONDS = 60
+
+# Prometheus /metrics histogram buckets (seconds)
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_WAKE_BUCKETS = (0.5, 1, 1.5, 2, 3, 4, 5, 7.5, 10, 15)
+
+# Browsers may reuse the web UI for this long before revalidating (304 if unchanged)
+UI_CACHE_MAX_AGE = 300
+
+# VCP features read together by /state in one bus session (power and brightness
+# are always included); add e.g. "12" (contrast) or "14" (color preset)
+STATE_EXTRA_VCP_CODES = []
+
+# POST /batch: ordered VCP operations run together in one bus session
+BATCH_MAX_STEPS = 32
+
+# Generic /vcp/<code> API: requests are checked against the monitor's
+# capabilities string, which is read once per monitor (keyed by EDID) and kept
+CAPABILITIES_FILE = os.path.join(STATE_DIR, "monitor_capabilities.json")
+CAPABILITIES_RETRY_INTERVAL = 300  # Seconds before retrying a failed capabilities read
+VCP_FEATURE_NAMES = {
+    "02": "New control value",
+    "04": "Restore factory defaults",
+    "05": "Restore brightness and contrast",
+    "08": "Restore color defaults",
+    "10": "Brightness",
+    "12": "Contrast",
+    "14": "Select color preset",
+    "16": "Video gain: Red",
+    "18": "Video gain: Green",
+    "1a": "Video gain: Blue",
+    "52": "Active control",
+    "60": "Input source",
+    "87": "Sharpness",
+    "ac": "Horizontal frequency",
+    "ae": "Vertical frequency",
+    "b2": "Flat panel sub-pixel layout",
+    "b6": "Display technology type",
+    "c6": "Application enable key",
+    "c8": "Display controller type",
+    "c9": "Display firmware level",
+    "d6": "Power mode",
+    "dc": "Display mode",
+    "df": "VCP version",
+}
 
 # HTML template for web interface
 HTML_TEMPLATE = """
@@ -500,6 +715,27 @@ HTML_TEMPLATE = """
                     </div>
                     <div class="api-description">Get current power state (returns JSON)</div>
                 </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/state</span>
+                    </div>
+                    <div class="api-description">Get power, brightness and watchdog status in one call</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/events</span>
+                    </div>
+                    <div class="api-description">Server-Sent Events stream of state, watchdog and operation changes</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/metrics</span>
+                    </div>
+                    <div class="api-description">Prometheus metrics (request, DDC and wake latency)</div>
+                </div>
                 <div class="api-endpoint">
                     <div>
                         <span class="api-method">GET</span>
@@ -521,6 +757,48 @@ HTML_TEMPLATE = """
                     </div>
                     <div class="api-description">Set brightness to specific level (0-100)</div>
                 </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">POST</span>
+                        <span class="api-path">/batch</span>
+                    </div>
+                    <div class="api-description">Run a list of VCP reads and writes in one bus session</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/vcp/&lt;code&gt;</span>
+                    </div>
+                    <div class="api-description">Read any VCP feature the monitor supports (GET /vcp lists them)</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">POST</span>
+                        <span class="api-path">/vcp/&lt;code&gt;/&lt;value&gt;</span>
+                    </div>
+                    <div class="api-description">Write any VCP feature the monitor supports</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/operations/&lt;id&gt;</span>
+                    </div>
+                    <div class="api-description">Get the status of a background wake operation (?wait=seconds to block)</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/wake/stats</span>
+                    </div>
+                    <div class="api-description">Get measured wake latency statistics</div>
+                </div>
+                <div class="api-endpoint">
+                    <div>
+                        <span class="api-method">GET</span>
+                        <span class="api-path">/sleepwatch</span>
+                    </div>
+                    <div class="api-description">Get Posterr sleep watcher status</div>
+                </div>
                 <div class="api-endpoint">
                     <div>
                         <span class="api-method">GET</span>
@@ -533,7 +811,7 @@ HTML_TEMPLATE = """
                         <span class="api-method">GET</span>
                         <span class="api-path">/watchdog/log</span>
                     </div>
-                    <div class="api-description">Get recent watchdog log entries (last 20)</div>
+                    <div class="api-description">Get recent watchdog log entries (?lines=N, default 20; ?before=cursor for older)</div>
                 </div>
             </div>
         </div>
@@ -553,6 +831,7 @@ HTML_TEMPLATE = """
             <button class="api-toggle" onclick="toggleWatchdogLog()">Show Recent Log</button>
             <div class="watchdog-log" id="watchdog-log" style="display: none; margin-top: 15px;">
                 <div id="watchdog-log-content">Loading...</div>
+                <button class="api-toggle" id="watchdog-log-older" onclick="loadOlderWatchdogLog()" style="display: none; margin-top: 10px;">Load Older Entries</button>
             </div>
         </div>
 
@@ -593,6 +872,7 @@ HTML_TEMPLATE = """
         let isLoading = false;
         let brightnessTimeout = null;
         let watchdogLogVisible = false;
+        let watchdogLogCursor = null;
 
         function toggleAPI() {
             const content = document.getElementById('api-content');
@@ -622,33 +902,43 @@ HTML_TEMPLATE = """
             }
         }
 
-        async function refreshWatchdog() {
-            try {
-                const response = await fetch('/watchdog');
-                const data = await response.json();
+        function updateWatchdogDisplay(data) {
+            const statusDiv = document.getElementById('watchdog-status');
+            const statusText = document.getElementById('watchdog-status-text');
+            const restarts = document.getElementById('watchdog-restarts');
+
+            // Update status
+            statusText.textContent = data.last_check || 'Never';
+            restarts.textContent = data.restart_count;
+
+            // Update styling based on restart count
+            statusDiv.className = 'watchdog-status';
+            if (data.restart_count === 0) {
+                statusDiv.classList.add('healthy');
+            } else if (data.restart_count < 5) {
+                statusDiv.classList.add('issues');
+            } else {
+                statusDiv.classList.add('error');
+            }
+        }
 
-                if (data.status === 'success') {
-                    const statusDiv = document.getElementById('watchdog-status');
-                    const statusText = document.getElementById('watchdog-status-text');
-                    const restarts = document.getElementById('watchdog-restarts');
-
-                    // Update status
-                    statusText.textContent = data.last_check || 'Never';
-                    restarts.textContent = data.restart_count;
-
-                    // Update styling based on restart count
-                    statusDiv.className = 'watchdog-status';
-                    if (data.restart_count === 0) {
-                        statusDiv.classList.add('healthy');
-                    } else if (data.restart_count < 5) {
-                        statusDiv.classList.add('issues');
-                    } else {
-                        statusDiv.classList.add('error');
-                    }
+        function renderLogEntries(entries) {
+            return entries.map(entry => {
+                let className = 'log-entry';
+                if (entry.includes('Network down')) {
+                    className += ' down';
+                } else if (entry.includes('Recovery')) {
+                    className += ' recovery';
+                } else if (entry.includes('Network OK')) {
+                    className += ' ok';
                 }
-            } catch (error) {
-                console.error('Failed to get watchdog status:', error);
-            }
+                return `<div class="${className}">${entry}</div>`;
+            }).join('');
+        }
+
+        function setWatchdogLogCursor(cursor) {
+            watchdogLogCursor = cursor;
+            document.getElementById('watchdog-log-older').style.display = cursor === null ? 'none' : 'block';
         }
 
         async function refreshWatchdogLog() {
@@ -662,24 +952,32 @@ HTML_TEMPLATE = """
                     if (data.entries.length === 0) {
                         logContent.innerHTML = '<div class="log-entry">No log entries yet</div>';
                     } else {
-                        logContent.innerHTML = data.entries.map(entry => {
-                            let className = 'log-entry';
-                            if (entry.includes('Network down')) {
-                                className += ' down';
-                            } else if (entry.includes('Recovery')) {
-                                className += ' recovery';
-                            } else if (entry.includes('Network OK')) {
-                                className += ' ok';
-                            }
-                            return `<div class="${className}">${entry}</div>`;
-                        }).join('');
+                        logContent.innerHTML = renderLogEntries(data.entries);
                     }
+                    setWatchdogLogCursor(data.cursor);
                 }
             } catch (error) {
                 console.error('Failed to get watchdog log:', error);
             }
         }
 
+        async function loadOlderWatchdogLog() {
+            if (watchdogLogCursor === null) return;
+
+            try {
+                const response = await fetch('/watchdog/log?before=' + watchdogLogCursor);
+                const data = await response.json();
+
+                if (data.status === 'success') {
+                    const logContent = document.getElementById('watchdog-log-content');
+                    logContent.insertAdjacentHTML('beforeend', renderLogEntries(data.entries));
+                    setWatchdogLogCursor(data.cursor);
+                }
+            } catch (error) {
+                console.error('Failed to get older watchdog log entries:', error);
+            }
+        }
+
         function setStatus(state, text) {
             const statusDiv = document.getElementById('status');
             statusDiv.className = 'status-display ' + state;
@@ -705,12 +1003,15 @@ HTML_TEMPLATE = """
             setStatus('loading', 'Checking...');
 
             try {
-                const response = await fetch('/status');
+                // Power, brightness and watchdog in one request and one bus session
+                const response = await fetch('/state?fresh=1');
                 const data = await response.json();
 
                 if (data.status === 'success') {
                     const state = data.state;
                     setStatus(state, state === 'on' ? 'ON' : 'OFF');
+                    updateBrightnessDisplay(data.brightness);
+                    updateWatchdogDisplay(data.watchdog);
                     updateLastUpdated();
                 } else {
                     setStatus('error', 'Error: ' + data.message);
@@ -720,36 +1021,41 @@ HTML_TEMPLATE = """
             } finally {
                 setLoading(false);
             }
+        }
 
-            // Also refresh brightness and watchdog
-            await refreshBrightness();
-            await refreshWatchdog();
+        function updateBrightnessDisplay(value) {
+            document.getElementById('brightness-value').textContent = value + '%';
+            document.getElementById('brightness-slider').value = value;
         }
 
-        async function refreshBrightness() {
-            try {
-                const response = await fetch('/brightness');
+        // Wait for a background operation started by a 202 response
+        async function waitForOperation(operationId) {
+            while (true) {
+                const response = await fetch('/operations/' + operationId + '?wait=15');
                 const data = await response.json();
 
-                if (data.status === 'success') {
-                    updateBrightnessDisplay(data.brightness);
+                if (data.status !== 'success' || data.operation.status !== 'running') {
+                    return data.operation || {status: 'failed', message: data.message};
                 }
-            } catch (error) {
-                console.error('Failed to get brightness:', error);
             }
         }
 
-        function updateBrightnessDisplay(value) {
-            document.getElementById('brightness-value').textContent = value + '%';
-            document.getElementById('brightness-slider').value = value;
-        }
-
         async function setBrightness(value) {
             try {
                 const response = await fetch('/brightness/' + value);
                 const data = await response.json();
 
-                if (data.status === 'success') {
+                if (data.status === 'accepted') {
+                    // Display is waking from brightness 0
+                    setStatus('loading', 'Waking Up...');
+                    const operation = await waitForOperation(data.operation_id);
+                    if (operation.status === 'succeeded') {
+                        setStatus('on', 'ON');
+                        updateBrightnessDisplay(operation.result.brightness);
+                    } else {
+                        setStatus('error', 'Error: ' + operation.message);
+                    }
+                } else if (data.status === 'success') {
                     updateBrightnessDisplay(data.brightness);
                 } else {
                     console.error('Failed to set brightness:', data.message);
@@ -773,6 +1079,7 @@ HTML_TEMPLATE = """
             // Debounce the actual brightness change
             clearTimeout(brightnessTimeout);
             brightnessTimeout = setTimeout(() => {
+                brightnessTimeout = null;
                 setBrightness(value);
             }, 500);
         });
@@ -787,7 +1094,19 @@ HTML_TEMPLATE = """
                 const response = await fetch('/on');
                 const data = await response.json();
 
-                if (data.status === 'success') {
+                if (data.status === 'accepted') {
+                    setStatus('loading', 'Waking Up...');
+                    const operation = await waitForOperation(data.operation_id);
+                    if (operation.status === 'succeeded') {
+                        setStatus('on', 'ON');
+                        if (operation.result.brightness > 0) {
+                            updateBrightnessDisplay(operation.result.brightness);
+                        }
+                        updateLastUpdated();
+                    } else {
+                        setStatus('error', 'Error: ' + operation.message);
+                    }
+                } else if (data.status === 'success') {
                     setStatus('on', 'ON');
                     updateLastUpdated();
                 } else {
@@ -823,73 +1142,2695 @@ HTML_TEMPLATE = """
             }
         }
 
-        // Refresh status on page load
-        refreshStatus();
+        // Cached state every 30 seconds while the event stream is unavailable
+        let pollTimer = null;
+
+        async function pollState() {
+            try {
+                const response = await fetch('/state');
+                const data = await response.json();
+
+                if (data.status === 'success') {
+                    if (!isLoading) {
+                        setStatus(data.state, data.state === 'on' ? 'ON' : 'OFF');
+                    }
+                    if (brightnessTimeout === null) {
+                        updateBrightnessDisplay(data.brightness);
+                    }
+                    updateWatchdogDisplay(data.watchdog);
+                    updateLastUpdated();
+                }
+            } catch (error) {
+                setStatus('error', 'Connection Error');
+            }
+        }
+
+        function startPolling() {
+            if (pollTimer === null) {
+                pollState();
+                pollTimer = setInterval(pollState, 30000);
+            }
+        }
+
+        function stopPolling() {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+
+        // Live updates pushed by the server; the browser reconnects on its own
+        // and each connection starts with a fresh snapshot
+        function connectEvents() {
+            const source = new EventSource('/events');
+
+            source.onopen = () => {
+                stopPolling();
+            };
+
+            source.addEventListener('state', (e) => {
+                const data = JSON.parse(e.data);
+                if (data.state && !isLoading) {
+                    setStatus(data.state, data.state === 'on' ? 'ON' : 'OFF');
+                }
+                if (data.brightness !== null && brightnessTimeout === null) {
+                    updateBrightnessDisplay(data.brightness);
+                }
+                updateLastUpdated();
+            });
+
+            source.addEventListener('watchdog', (e) => {
+                updateWatchdogDisplay(JSON.parse(e.data));
+                if (watchdogLogVisible) {
+                    refreshWatchdogLog();
+                }
+            });
+
+            source.addEventListener('operation', (e) => {
+                const operation = JSON.parse(e.data);
+                if (operation.kind === 'wake' && operation.status === 'running' && !isLoading) {
+                    setStatus('loading', 'Waking Up...');
+                }
+            });
+
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    // Refused, e.g. too many open tabs: the browser will not
+                    // retry, so poll until a stream can be opened again
+                    startPolling();
+                    setTimeout(connectEvents, 60000);
+                } else if (pollTimer === null) {
+                    setStatus('error', 'Reconnecting...');
+                }
+            };
+        }
 
-        // Auto-refresh every 30 seconds
-        setInterval(refreshStatus, 30000);
+        connectEvents();
     </script>
 </body>
 </html>
 """
 
 
+class MetricsRegistry:
+    """Prometheus metrics with lock-free recording
+
+    Each thread records into its own dict, so the hot path is a dict update
+    with no lock. Shards are only summed, and rendered to the Prometheus
+    text format, when /metrics is scraped. Gauges are callbacks evaluated
+    at scrape time.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []  # (thread, values) per recording thread
+        self.retired = collections.defaultdict(float)  # Totals from threads that exited
+        self.definitions = collections.OrderedDict()  # name -> (type, help, buckets or callback)
+
+    def counter(self, name, help_text):
+        self.definitions[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=METRICS_LATENCY_BUCKETS):
+        self.definitions[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauge(self, name, help_text, callback):
+        """callback() returns a number or {labels tuple: number}"""
+        self.definitions[name] = ("gauge", help_text, callback)
+
+    def inc(self, name, labels=(), amount=1):
+        self._values()[(name, labels, None)] += amount
+
+    def observe(self, name, value, labels=()):
+        buckets = self.definitions[name][2]
+        values = self._values()
+        values[(name, labels, bisect.bisect_left(buckets, value))] += 1
+        values[(name, labels, "sum")] += value
+        values[(name, labels, "count")] += 1
+
+    def render(self):
+        """Current values in the Prometheus text exposition format"""
+        totals = self._collect()
+        series = collections.defaultdict(dict)  # name -> {(labels, part): value}
+        for (name, labels, part), value in totals.items():
+            series[name][(labels, part)] = value
+
+        lines = []
+        for name, (kind, help_text, extra) in self.definitions.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "gauge":
+                try:
+                    value = extra()
+                except Exception:
+                    continue
+                items = value.items() if isinstance(value, dict) else [((), value)]
+                for labels, number in items:
+                    lines.append(f"{name}{self._labels(labels)} {number}")
+            elif kind == "counter":
+                for (labels, _), value in sorted(series[name].items()):
+                    lines.append(f"{name}{self._labels(labels)} {self._number(value)}")
+            else:
+                for labels in sorted({labels for labels, _ in series[name]}):
+                    cumulative = 0
+                    for index, bound in enumerate(extra):
+                        cumulative += series[name].get((labels, index), 0)
+                        lines.append(f"{name}_bucket{self._labels(labels, le=bound)} {self._number(cumulative)}")
+                    cumulative += series[name].get((labels, len(extra)), 0)
+                    lines.append(f"{name}_bucket{self._labels(labels, le='+Inf')} {self._number(cumulative)}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {series[name].get((labels, 'sum'), 0)}")
+                    lines.append(f"{name}_count{self._labels(labels)} {self._number(series[name].get((labels, 'count'), 0))}")
+        return "\n".join(lines) + "\n"
+
+    def _values(self):
+        try:
+            return self.local.values
+        except AttributeError:
+            values = collections.defaultdict(float)
+            self.local.values = values
+            with self.lock:
+                # Threads come and go (operations, the development server's
+                # per-request threads), so retire exited ones here too;
+                # otherwise shards pile up between scrapes
+                self._retire_exited()
+                self.shards.append((threading.current_thread(), values))
+            return values
+
+    def _retire_exited(self):
+        """Fold the shards of exited threads into self.retired; call with self.lock held"""
+        alive = []
+        for thread, values in self.shards:
+            if thread.is_alive():
+                alive.append((thread, values))
+            else:
+                for key, value in list(values.items()):
+                    self.retired[key] += value
+        self.shards = alive
+
+    def _collect(self):
+        """Sum every thread's shard, folding exited threads into self.retired"""
+        with self.lock:
+            self._retire_exited()
+            totals = collections.defaultdict(float, self.retired)
+            for thread, values in self.shards:
+                for key, value in list(values.items()):
+                    totals[key] += value
+        return totals
+
+    def _labels(self, labels, le=None):
+        """Format (name, value) label pairs"""
+        pairs = list(labels)
+        if le is not None:
+            pairs.append(("le", le))
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{self._escape(value)}"' for key, value in pairs) + "}"
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @staticmethod
+    def _number(value):
+        return int(value) if float(value).is_integer() else value
+
+
+metrics = MetricsRegistry()
+metrics.counter("monitor_http_requests_total", "HTTP requests by endpoint, method and status")
+metrics.histogram("monitor_http_request_duration_seconds", "HTTP request latency by endpoint")
+metrics.histogram("monitor_ddc_operation_duration_seconds", "DDC bus operation latency by operation and VCP code")
+metrics.counter("monitor_ddc_operation_errors_total", "Failed DDC bus operations by operation, VCP code and failure kind")
+metrics.counter("monitor_ddc_retries_total", "DDC/CI transactions retried after a transient failure, by failure kind")
+metrics.histogram("monitor_ddc_queue_wait_seconds", "Time DDC operations waited for the bus worker")
+metrics.counter("monitor_subprocess_spawns_total", "Subprocesses started by run_command")
+metrics.counter("monitor_subprocess_timeouts_total", "Subprocesses killed at the run_command timeout")
+metrics.histogram("monitor_wake_latency_seconds", "Seconds from power-on until the monitor answered consistently",
+                  buckets=METRICS_WAKE_BUCKETS)
+metrics.counter("monitor_wake_timeouts_total", "Wakes where the monitor never settled within WAKE_TIMEOUT")
+metrics.counter("monitor_sleepwatch_polls_total", "Posterr /api/sleep polls by result")
+metrics.counter("monitor_sleepwatch_transitions_total", "Power changes made by the sleep watcher")
+metrics.counter("monitor_sleepwatch_suppressed_total", "Posterr sleep changes that reverted before the hysteresis thresholds")
+metrics.counter("monitor_webhook_deliveries_total", "Webhook batch deliveries by result")
+
+
+# Per-request phase timings for the Server-Timing header. Each thread points
+# timing_context.phases at the dict collecting its current request's (or DDC
+# job's) phases; recording is a no-op when nothing is collecting.
+timing_context = threading.local()
+
+
+def record_phase(name, seconds):
+    """Add time to a named phase of whatever the current thread is timing"""
+    phases = getattr(timing_context, "phases", None)
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def merge_phases(phases):
+    """Fold phases recorded on another thread (e.g. the DDC worker) into the current one"""
+    for name, seconds in phases.items():
+        record_phase(name, seconds)
+
+
+class SamplingProfiler:
+    """Opt-in wall-clock sampler of every thread's stack
+
+    Samples sys._current_frames() at a fixed interval and aggregates the
+    stacks into the folded format used by flamegraph.pl and speedscope
+    ("thread;file:function;... count"). Nothing runs unless a profile is
+    requested.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def profile(self, seconds, interval):
+        """Sample for `seconds`; returns folded stacks, or None if a profile is already running"""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            own_thread = threading.get_ident()
+            counts = collections.Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    # Fold numbered pool threads (http_0, http_1, ...) together
+                    thread_name = re.sub(r"[_-]?\d+$", "", names.get(ident, "thread"))
+                    stack.append(thread_name)
+                    counts[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+        finally:
+            self.lock.release()
+
+
+profiler = SamplingProfiler()
+
+
 def run_command(command):
     """Execute a shell command and return success status"""
+    metrics.inc("monitor_subprocess_spawns_total")
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        with timed_phase("spawn"):
+            result = subprocess.run(
+                command,
+                shell=True,
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
         return result.returncode == 0, result.stdout, result.stderr
     except subprocess.TimeoutExpired:
+        metrics.inc("monitor_subprocess_timeouts_total")
         return False, "", "Command timed out"
     except Exception as e:
         return False, "", str(e)
 
 
-def get_monitor_status():
-    """Query the monitor's current power state via ddcutil"""
-    success, stdout, stderr = run_command(
-        f"sudo ddcutil getvcp {DDC_FEATURE_POWER} --bus {DDC_BUS}"
-    )
+class DdcError(Exception):
+    """A DDC/CI transaction with the monitor failed
+
+    `kind` classifies the failure for the retry policy and circuit breaker:
+    "nack" (no or garbled answer), "busy" (null reply), "timeout",
+    "missing" (no monitor or bus), or "error" for anything else.
+    """
+
+    def __init__(self, message, kind="error"):
+        super().__init__(message)
+        self.kind = kind
+
+
+class DdcUnsupportedError(DdcError):
+    """The monitor reported that a VCP feature is not supported"""
+
+    def __init__(self, message):
+        super().__init__(message, "unsupported")
+
+
+class DdcCircuitOpenError(DdcError):
+    """The circuit breaker is open, so the operation was not attempted"""
+
+    def __init__(self, message):
+        super().__init__(message, "open")
 
-    if not success:
-        return None, f"Failed to query monitor: {stderr}"
 
-    # Parse output looking for "DPM: On" or "DPM: Off"
-    # Example: "VCP code 0xd6 (Power mode): DPM: On,  DPMS: Off (sl=0x01)"
-    match = re.search(r'DPM:\s*(On|Off)', stdout)
+def classify_os_error(e):
+    """DdcError kind for a failed I2C transfer"""
+    if e.errno in (errno.ENODEV, errno.ENOENT, errno.ENXIO):
+        return "missing"
+    if e.errno == errno.ETIMEDOUT:
+        return "timeout"
+    if e.errno in (errno.EBUSY, errno.EAGAIN):
+        return "busy"
+    return "nack"  # EREMOTEIO, EIO: the controller did not acknowledge
+
+
+def classify_ddcutil_error(stderr):
+    """DdcError kind for a failed ddcutil run, from its error output"""
+    text = stderr.lower()
+    if "timed out" in text:
+        return "timeout"
+    if any(s in text for s in ("no monitor", "not found", "no such", "invalid display")):
+        return "missing"
+    if any(s in text for s in ("busy", "null response", "null_response")):
+        return "busy"
+    if any(s in text for s in ("communication failed", "retries exceeded", "remoteio", "ddcrc")):
+        return "nack"
+    return "error"
+
+
+def ddc_checksum(seed, data):
+    """XOR checksum used by DDC/CI messages"""
+    checksum = seed
+    for byte in data:
+        checksum ^= byte
+    return checksum
+
+
+class DdcBackend:
+    """Interface for reading and writing VCP features on the monitor
+
+    Feature codes are hex strings as used in the configuration ("d6", "10").
+    Failures raise DdcError.
+    """
+
+    name = "base"
+    retry_transient = True  # Backends that retry NACKs and busy replies skip that while False
+
+    def get_vcp(self, code):
+        """Return (current, maximum) for a VCP feature"""
+        raise NotImplementedError
+
+    def get_vcp_many(self, codes):
+        """Return {code: (current, maximum)} for several features in one bus session
+
+        Features the monitor does not support are left out of the result.
+        """
+        results = {}
+        for code in codes:
+            try:
+                results[code] = self.get_vcp(code)
+            except DdcUnsupportedError:
+                pass
+        return results
+
+    def set_vcp(self, code, value):
+        """Write a new value to a VCP feature"""
+        raise NotImplementedError
+
+    def get_capabilities(self):
+        """Return the monitor's raw MCCS capabilities string"""
+        raise NotImplementedError
+
+    def get_edid(self):
+        """Return the monitor's EDID bytes, or None if they cannot be read"""
+        return read_sysfs_edid(DDC_BUS)
+
+    def run_batch(self, steps, stop_on_error=True):
+        """Run [(op, code, value)] in order in one bus session
+
+        op is "get" or "set". Returns [(result, error, seconds)] per step run,
+        where result is (current, maximum) for a get and None for a set, and
+        error is a DdcError or None. With stop_on_error, the steps after the
+        first failure are not run and are left out of the result.
+        """
+        results = []
+        for op, code, value in steps:
+            started = time.perf_counter()
+            try:
+                result = self.get_vcp(code) if op == "get" else self.set_vcp(code, value)
+                error = None
+            except DdcError as e:
+                result, error = None, e
+            results.append((result, error, time.perf_counter() - started))
+            if error and stop_on_error:
+                break
+        return results
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class DdcutilBackend(DdcBackend):
+    """Backend that shells out to `sudo ddcutil` for every operation"""
+
+    name = "ddcutil"
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def get_vcp(self, code):
+        results = self.get_vcp_many([code])
+        if code not in results:
+            raise DdcUnsupportedError(f"VCP feature {code} is not supported")
+        return results[code]
+
+    def get_vcp_many(self, codes):
+        # One ddcutil run reads every feature
+        success, stdout, stderr = run_command(
+            f"{DDCUTIL_COMMAND} getvcp {' '.join(codes)} --bus {self.bus} --brief"
+        )
+        if not success:
+            raise DdcError(stderr.strip() or "ddcutil getvcp failed", classify_ddcutil_error(stderr))
+
+        results = parse_ddcutil_brief(stdout)
+        if not results and "ERR" not in stdout:
+            raise DdcError(f"Could not parse ddcutil output: {stdout.strip()}")
+        return {code: results[code.lower()] for code in codes if code.lower() in results}
+
+    def set_vcp(self, code, value):
+        self._set_vcp_many([(code, value)])
+
+    def run_batch(self, steps, stop_on_error=True):
+        # Consecutive reads share one getvcp run and consecutive writes one
+        # setvcp run; every step of a run reports that run's time
+        results = []
+        for op, group in itertools.groupby(steps, key=lambda step: step[0]):
+            group = list(group)
+            started = time.perf_counter()
+            try:
+                if op == "get":
+                    values = self.get_vcp_many([code for _, code, _ in group])
+                    outcomes = [
+                        (values[code], None) if code in values
+                        else (None, DdcUnsupportedError(f"VCP feature {code} is not supported"))
+                        for _, code, _ in group
+                    ]
+                else:
+                    self._set_vcp_many([(code, value) for _, code, value in group])
+                    outcomes = [(None, None)] * len(group)
+            except DdcError as e:
+                outcomes = [(None, e)] * len(group)
+            seconds = time.perf_counter() - started
+
+            for result, error in outcomes:
+                results.append((result, error, seconds))
+                if error and stop_on_error:
+                    return results
+        return results
+
+    def get_capabilities(self):
+        success, stdout, stderr = run_command(
+            f"{DDCUTIL_COMMAND} capabilities --bus {self.bus} --verbose"
+        )
+        if not success:
+            raise DdcError(stderr.strip() or "ddcutil capabilities failed", classify_ddcutil_error(stderr))
+        return parse_ddcutil_capabilities(stdout)
+
+    def _set_vcp_many(self, values):
+        """Write [(code, value)] in order with one ddcutil run"""
+        pairs = " ".join(f"{code} {value}" for code, value in values)
+        success, stdout, stderr = run_command(
+            f"{DDCUTIL_COMMAND} setvcp {pairs} --bus {self.bus}"
+        )
+        if not success:
+            raise DdcError(stderr.strip() or "ddcutil setvcp failed", classify_ddcutil_error(stderr))
+
+
+def parse_ddcutil_brief(stdout):
+    """Parse `ddcutil getvcp --brief` output into {code: (current, maximum)}
+
+    Example lines:
+        "VCP 10 C 50 100"          continuous: current, maximum
+        "VCP D6 SNC x01"           simple non-continuous: value
+        "VCP 14 CNC x00 x0b x00 x05"  complex non-continuous: mh ml sh sl
+        "VCP 87 ERR"               unsupported or failed
+    """
+    results = {}
+    for line in stdout.splitlines():
+        fields = line.split()
+        if len(fields) < 3 or fields[0] != "VCP":
+            continue
+        code, kind, values = fields[1].lower(), fields[2], fields[3:]
+        try:
+            if kind == "C" and len(values) >= 2:
+                results[code] = (int(values[0]), int(values[1]))
+            elif kind == "SNC" and values:
+                results[code] = (int(values[0].lstrip("x"), 16), 0)
+            elif kind == "CNC" and len(values) >= 4:
+                mh, ml, sh, sl = (int(v.lstrip("x"), 16) for v in values[:4])
+                results[code] = ((sh << 8) | sl, (mh << 8) | ml)
+        except ValueError:
+            continue
+    return results
+
+
+def parse_ddcutil_capabilities(stdout):
+    """Extract the raw capabilities string from `ddcutil capabilities --verbose`
+
+    Falls back to rebuilding the vcp() section from the "Feature: XX" and
+    "XX: name" value lines of the interpreted output.
+    """
+    match = re.search(r"capabilities string:\s*(\(.*\))\s*$", stdout, re.MULTILINE | re.IGNORECASE)
     if match:
-        state = match.group(1)
-        return state == "On", None
+        return match.group(1)
+
+    features = []
+    for line in stdout.splitlines():
+        feature = re.match(r"\s*Feature:\s*([0-9A-Fa-f]{2})\b", line)
+        value = re.match(r"\s*([0-9A-Fa-f]{2}):\s", line)
+        if feature:
+            features.append([feature.group(1), []])
+        elif value and features:
+            features[-1][1].append(value.group(1))
+    if not features:
+        raise DdcError(f"Could not parse ddcutil capabilities output: {stdout.strip()[:200]}")
+    vcp = " ".join(f"{code}({' '.join(values)})" if values else code for code, values in features)
+    return f"(vcp({vcp}))"
+
+
+def parse_capabilities(text):
+    """Parse an MCCS capabilities string
+
+    "(prot(monitor)model(S24B300)vcp(10 14(05 08) D6(01 04))mccs_ver(2.0))"
+    becomes {"model": "S24B300", "mccs_version": "2.0",
+             "features": {"10": None, "14": [5, 8], "d6": [1, 4]}},
+    where a feature's list holds the values it accepts (None: any).
+    """
+    text = text.strip()
+    if text.startswith("(") and text.endswith(")"):
+        text = text[1:-1]
+
+    # Top-level name(content) sections; content may nest parentheses
+    sections = {}
+    i = 0
+    while i < len(text):
+        start = text.find("(", i)
+        if start < 0:
+            break
+        depth, end = 0, start
+        while end < len(text):
+            depth += {"(": 1, ")": -1}.get(text[end], 0)
+            if depth == 0:
+                break
+            end += 1
+        sections[text[i:start].strip().lower()] = text[start + 1:end]
+        i = end + 1
+    if "vcp" not in sections:
+        raise ValueError("Capabilities string has no vcp() section")
+
+    # Feature codes at depth 0, each optionally followed by (values); any
+    # deeper nesting (MCCS 3 sub-values) is ignored
+    features = {}
+    code, depth = None, 0
+    for token in re.findall(r"[()]|[^\s()]+", sections["vcp"]):
+        if token == "(":
+            depth += 1
+            if depth == 1 and code is not None:
+                features[code] = []
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0 and re.fullmatch(r"[0-9A-Fa-f]{2}", token):
+            code = token.lower()
+            features[code] = None
+        elif depth == 1 and code is not None and re.fullmatch(r"[0-9A-Fa-f]{1,2}", token):
+            features[code].append(int(token, 16))
+    for code, values in features.items():
+        if values == []:
+            features[code] = None
+    return {
+        "model": sections.get("model"),
+        "mccs_version": sections.get("mccs_ver"),
+        "features": features,
+    }
+
+
+def read_sysfs_edid(bus):
+    """EDID of the display connector whose DDC channel is /dev/i2c-<bus>, or None"""
+    try:
+        for connector in os.listdir("/sys/class/drm"):
+            path = os.path.join("/sys/class/drm", connector)
+            ddc_link = os.path.join(path, "ddc")
+            if os.path.islink(ddc_link) and os.path.basename(os.readlink(ddc_link)) == f"i2c-{bus}":
+                with open(os.path.join(path, "edid"), 'rb') as f:
+                    return f.read() or None
+    except OSError:
+        pass
+    return None
+
+
+class I2cDevice:
+    """Raw i2c-dev character device bound to the monitor's DDC/CI address"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR)
+        try:
+            fcntl.ioctl(self.fd, I2C_SLAVE, DDC_CI_ADDRESS)
+        except OSError:
+            os.close(self.fd)
+            raise
 
-    return None, "Could not parse monitor status"
+    def write(self, data):
+        os.write(self.fd, bytes(data))
 
+    def read(self, length):
+        return os.read(self.fd, length)
 
-def get_brightness():
-    """Query the monitor's current brightness level via ddcutil"""
-    success, stdout, stderr = run_command(
-        f"sudo ddcutil getvcp {DDC_FEATURE_BRIGHTNESS} --bus {DDC_BUS}"
+    def close(self):
+        os.close(self.fd)
+
+
+class FakeI2cDevice:
+    """In-memory stand-in for a monitor's DDC/CI controller
+
+    Speaks the same byte protocol as the real device so that NativeDdcBackend
+    can be exercised without hardware.
+    """
+
+    # What the S24B300 reports, trimmed to the features the README lists
+    CAPABILITIES = (
+        "(prot(monitor)type(LCD)model(S24B300)cmds(01 02 03 07 0C E3 F3)"
+        "vcp(02 04 05 08 10 12 14(02 03 04 07 08 0B) 16 18 1A 60(01 03) 87 D6(01 04) DC(01 02 03 04 05 06) DF)"
+        "mswhql(1)mccs_ver(2.0))"
     )
+    EDID = bytes.fromhex("00ffffffffffff004c2d5e083000000006170103")  # Samsung, week 6 of 2013
+
+    def __init__(self, features=None, wake_delay=0.0, nack_rate=0.0, latency=0.0):
+        # VCP code -> [current, maximum]
+        self.features = features or {
+            0xd6: [DDC_POWER_ON, 0x05],
+            0x10: [DEFAULT_BRIGHTNESS, 100],
+            0x12: [75, 100],
+            0x14: [0x02, 0x0B],
+            0x16: [50, 100],
+            0x18: [50, 100],
+            0x1a: [50, 100],
+            0x60: [0x03, 0x03],
+            0x87: [50, 100],
+            0xdc: [0x01, 0x06],
+            0xdf: [0x0200, 0xFFFF],
+        }
+        self.edid = self.EDID
+        self.wake_delay = wake_delay  # Seconds the controller NACKs after power-on
+        self.nack_rate = nack_rate  # Probability that any transfer is NACKed
+        self.latency = latency  # Seconds each transfer occupies the bus
+        self.random = random.Random()
+        self.waking_until = 0.0
+        self.pending_reply = None
+
+    def write(self, data):
+        data = bytes(data)
+        self._transfer()
+        if len(data) < 3 or data[0] != DDC_HOST_ADDRESS or self._waking():
+            raise OSError(121, "Remote I/O error")
+        if ddc_checksum(DDC_WRITE_CHECKSUM_SEED, data[:-1]) != data[-1]:
+            # A real controller silently drops corrupt requests
+            self.pending_reply = None
+            return
+
+        opcode = data[2]
+        if opcode == DDC_OP_GET_VCP:
+            code = data[3]
+            if code in self.features:
+                current, maximum = self.features[code]
+                result = 0x00
+            else:
+                current, maximum, result = 0, 0, 0x01
+            payload = bytes([
+                DDC_OP_GET_VCP_REPLY, result, code, 0x00,
+                maximum >> 8, maximum & 0xFF, current >> 8, current & 0xFF,
+            ])
+            self.pending_reply = self._reply(payload)
+        elif opcode == DDC_OP_CAPABILITIES:
+            offset = (data[3] << 8) | data[4]
+            fragment = self.CAPABILITIES.encode()[offset:offset + 32]
+            self.pending_reply = self._reply(bytes([DDC_OP_CAPABILITIES_REPLY, data[3], data[4]]) + fragment)
+        elif opcode == DDC_OP_SET_VCP:
+            code = data[3]
+            if code in self.features:
+                value = (data[4] << 8) | data[5]
+                if code == 0xd6 and value == DDC_POWER_ON and self.features[code][0] != DDC_POWER_ON:
+                    self.waking_until = time.monotonic() + self.wake_delay
+                self.features[code][0] = value
+            self.pending_reply = None
+
+    def read(self, length):
+        self._transfer()
+        if self._waking():
+            raise OSError(121, "Remote I/O error")
+        reply = self.pending_reply or self._reply(b"")
+        self.pending_reply = None
+        return (reply + b"\x00" * length)[:length]
+
+    def close(self):
+        pass
 
-    if not success:
-        return None, f"Failed to query brightness: {stderr}"
+    def _transfer(self):
+        """Simulate the bus time and occasional NACK of one transfer"""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.nack_rate and self.random.random() < self.nack_rate:
+            raise OSError(121, "Remote I/O error")
+
+    def _waking(self):
+        return time.monotonic() < self.waking_until
+
+    def _reply(self, payload):
+        message = bytes([DDC_WRITE_CHECKSUM_SEED, 0x80 | len(payload)]) + payload
+        return message + bytes([ddc_checksum(DDC_READ_CHECKSUM_SEED, message)])
+
+
+class NativeDdcBackend(DdcBackend):
+    """In-process DDC/CI client that keeps the I2C device open"""
+
+    name = "native"
+
+    def __init__(self, device, reply_delay=DDC_REPLY_DELAY, message_delay=DDC_MESSAGE_DELAY):
+        self.device = device
+        self.reply_delay = reply_delay
+        self.message_delay = message_delay
+        self.lock = threading.RLock()  # Reentrant so run_batch() can hold it across steps
+        self.last_message = 0.0
+
+    def get_vcp(self, code):
+        with self.lock:
+            return self._retry(self._get_vcp, code)
+
+    def get_vcp_many(self, codes):
+        # Holding the lock keeps the whole batch in one bus session
+        with self.lock:
+            results = {}
+            for code in codes:
+                try:
+                    results[code] = self._retry(self._get_vcp, code)
+                except DdcUnsupportedError:
+                    pass
+            return results
+
+    def set_vcp(self, code, value):
+        vcp = int(code, 16)
+        with self.lock:
+            self._retry(self._send, bytes([DDC_OP_SET_VCP, vcp, (value >> 8) & 0xFF, value & 0xFF]))
+
+    def run_batch(self, steps, stop_on_error=True):
+        # One bus session; _send() keeps the DDC/CI spacing between messages
+        with self.lock:
+            return super().run_batch(steps, stop_on_error)
+
+    def get_capabilities(self):
+        """Capabilities Request transactions, one 32-byte fragment at a time"""
+        data = b""
+        with self.lock:
+            while True:
+                fragment = self._retry(self._get_capabilities_fragment, len(data))
+                if not fragment:
+                    break
+                data += fragment
+                if len(data) > DDC_CAPABILITIES_MAX_LENGTH:
+                    raise DdcError("Capabilities string too long")
+        return data.rstrip(b"\0").decode("ascii", errors="replace")
+
+    def get_edid(self):
+        return getattr(self.device, "edid", None) or super().get_edid()
+
+    def close(self):
+        self.device.close()
+
+    def _retry(self, transaction, *args):
+        """Run a transaction, retrying transient failures with jittered backoff; caller must hold self.lock
+
+        This is the only retry layer: the bus worker does not repeat
+        operations, and it clears retry_transient while a waking monitor
+        is expected to NACK.
+        """
+        delay = DDC_RETRY_BACKOFF
+        for attempt in range(1, DDC_RETRY_ATTEMPTS + 1):
+            try:
+                return transaction(*args)
+            except DdcError as e:
+                if e.kind not in DDC_RETRY_KINDS or attempt == DDC_RETRY_ATTEMPTS or not self.retry_transient:
+                    raise
+                metrics.inc("monitor_ddc_retries_total", (("kind", e.kind),))
+                with timed_phase("ddc-retry"):
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+
+    def _get_vcp(self, code):
+        """Get VCP Feature transaction; caller must hold self.lock"""
+        vcp = int(code, 16)
+        self._send(bytes([DDC_OP_GET_VCP, vcp]))
+        with timed_phase("ddc-delay"):
+            time.sleep(self.reply_delay)
+        reply = self._receive(DDC_GET_VCP_REPLY_LENGTH)
+
+        if len(reply) < 8 or reply[0] != DDC_OP_GET_VCP_REPLY or reply[2] != vcp:
+            raise DdcError(f"Unexpected reply to Get VCP {code}", "nack")
+        if reply[1] != 0x00:
+            raise DdcUnsupportedError(f"VCP feature {code} is not supported")
+        maximum = (reply[4] << 8) | reply[5]
+        current = (reply[6] << 8) | reply[7]
+        return current, maximum
+
+    def _get_capabilities_fragment(self, offset):
+        """Capabilities Request for the bytes at offset; caller must hold self.lock"""
+        self._send(bytes([DDC_OP_CAPABILITIES, offset >> 8, offset & 0xFF]))
+        with timed_phase("ddc-delay"):
+            time.sleep(self.reply_delay)
+        reply = self._receive(DDC_CAPABILITIES_REPLY_LENGTH)
+
+        if len(reply) < 3 or reply[0] != DDC_OP_CAPABILITIES_REPLY or (reply[1] << 8) | reply[2] != offset:
+            raise DdcError(f"Unexpected reply to Capabilities Request at offset {offset}", "nack")
+        return reply[3:]
+
+    def _wait_for_bus(self):
+        """Honour the minimum spacing the monitor needs between messages"""
+        remaining = self.last_message + self.message_delay - time.monotonic()
+        if remaining > 0:
+            with timed_phase("ddc-delay"):
+                time.sleep(remaining)
+
+    def _send(self, payload):
+        message = bytes([DDC_HOST_ADDRESS, 0x80 | len(payload)]) + payload
+        message += bytes([ddc_checksum(DDC_WRITE_CHECKSUM_SEED, message)])
+        self._wait_for_bus()
+        try:
+            with timed_phase("i2c"):
+                self.device.write(message)
+        except OSError as e:
+            raise DdcError(f"I2C write failed: {e}", classify_os_error(e))
+        finally:
+            self.last_message = time.monotonic()
+
+    def _receive(self, length):
+        """Read a reply and return its payload (opcode onwards)"""
+        try:
+            with timed_phase("i2c"):
+                data = self.device.read(length)
+        except OSError as e:
+            raise DdcError(f"I2C read failed: {e}", classify_os_error(e))
+        finally:
+            self.last_message = time.monotonic()
+
+        if len(data) < 3 or data[0] != DDC_WRITE_CHECKSUM_SEED:
+            raise DdcError("Invalid DDC/CI reply header", "nack")
+        size = data[1] & 0x7F
+        if size == 0:
+            raise DdcError("Monitor returned a null message (busy)", "busy")
+        if len(data) < size + 3:
+            raise DdcError("Truncated DDC/CI reply", "nack")
+        message, checksum = data[:size + 2], data[size + 2]
+        if ddc_checksum(DDC_READ_CHECKSUM_SEED, message) != checksum:
+            raise DdcError("DDC/CI reply checksum mismatch", "nack")
+        return message[2:]
+
+
+class CircuitBreaker:
+    """Stops sending DDC operations to a monitor that keeps failing
+
+    Closed: operations run and consecutive failures are counted. At
+    `threshold` the breaker opens and operations fail at once. After
+    `cooldown` seconds it is half-open: the next operation goes through as a
+    probe. Success closes the breaker; failure reopens it with the cooldown
+    doubled, up to `max_cooldown`. For a while after a power-on, NACKs and
+    busy replies are expected and not counted (see start_grace()).
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, threshold, cooldown, max_cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0  # Consecutive failed operations
+        self.current_cooldown = cooldown
+        self.opened_at = None
+        self.since = time.time()
+        self.grace_until = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self.failures_by_kind = collections.Counter()
+        self.last_error = None
+
+    def allow(self):
+        """Whether an operation may use the bus now (moving open to half-open when due)"""
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.current_cooldown:
+                    self.rejected += 1
+                    return False
+                self._set_state("half_open")
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != "closed":
+                self.current_cooldown = self.cooldown
+                self._set_state("closed")
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures_by_kind[error.kind] += 1
+            self.last_error = str(error)
+            if error.kind in DDC_RETRY_KINDS and time.monotonic() < self.grace_until:
+                return
+            self.failures += 1
+            if self.state == "half_open":
+                self.current_cooldown = min(self.max_cooldown, self.current_cooldown * 2)
+                self._open()
+            elif self.state == "closed" and self.failures >= self.threshold:
+                self._open()
+
+    def start_grace(self, seconds):
+        """Don't count NACKs or busy replies for a while, e.g. while the monitor wakes"""
+        with self.lock:
+            self.grace_until = time.monotonic() + seconds
+
+    def end_grace(self):
+        with self.lock:
+            self.grace_until = 0.0
+
+    def in_grace(self):
+        with self.lock:
+            return time.monotonic() < self.grace_until
+
+    def retry_in(self):
+        """Seconds until the next half-open probe (0 unless open)"""
+        with self.lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.opened_at + self.current_cooldown - time.monotonic())
+
+    def status(self):
+        retry_in = self.retry_in()
+        with self.lock:
+            return {
+                "state": self.state,
+                "since": datetime.fromtimestamp(self.since).isoformat(timespec="seconds"),
+                "consecutive_failures": self.failures,
+                "threshold": self.threshold,
+                "cooldown": self.current_cooldown,
+                "retry_in": round(retry_in, 1),
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "failures_by_kind": dict(self.failures_by_kind),
+                "waking_grace": time.monotonic() < self.grace_until,
+                "last_error": self.last_error,
+            }
 
-    # Parse output looking for current value
-    # Example: "VCP code 0x10 (Brightness                    ): current value =   100, max value =   100"
-    match = re.search(r'current value\s*=\s*(\d+)', stdout)
-    if match:
-        return int(match.group(1)), None
+    def _open(self):
+        """Caller must hold self.lock"""
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        self._set_state("open")
+
+    def _set_state(self, state):
+        """Caller must hold self.lock"""
+        if state == "open":
+            print(f"Warning: DDC circuit breaker open after {self.failures} failures "
+                  f"({self.last_error}); next probe in {self.current_cooldown}s")
+        elif state == "closed":
+            print("DDC circuit breaker closed: monitor answering again")
+        self.state = state
+        self.since = time.time()
+
+
+class DdcJob:
+    """A queued VCP operation waiting for the bus worker"""
+
+    def __init__(self, op, code, value, priority):
+        self.op = op
+        self.code = code
+        self.value = value
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.started = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 1
+        self.phases = {}  # Server-Timing phases recorded while the worker ran this job
+
+    def wait(self, timeout):
+        if not self.done.wait(timeout):
+            raise DdcError(f"Timed out waiting for the DDC bus ({self.op} {self.code})", "timeout")
+        merge_phases(self.phases)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class DdcWorker(DdcBackend):
+    """Single thread that owns the DDC bus and serializes every VCP operation
+
+    Power writes run ahead of other writes, which run ahead of reads.
+    Reads are single-flight: a read identical to one that is queued or already
+    on the bus waits for that job and shares its result instead of touching
+    the bus again. A write detaches in-flight reads of the features it
+    changes, so later readers see the written value.
+
+    Jobs run once; retrying transient failures is left to the backend, and
+    turned off while the breaker's wake grace runs. Every outcome feeds the
+    circuit breaker; while it is open, jobs fail with DdcCircuitOpenError
+    without touching the bus.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.breaker = CircuitBreaker(DDC_BREAKER_THRESHOLD, DDC_BREAKER_COOLDOWN, DDC_BREAKER_MAX_COOLDOWN)
+        self.queue = []  # heap of (priority, sequence, job)
+        self.flights = {}  # VCP code or tuple of codes -> read job that later readers can share
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.local = threading.local()  # Whether this thread's reads were shared
+        self.metrics = {
+            "completed": 0,
+            "failed": 0,
+            "shared_reads": 0,
+            "invalidated_reads": 0,
+            "max_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+        }
+        self.thread = threading.Thread(target=self._run, name="ddc-worker", daemon=True)
+        self.thread.start()
+
+    def get_vcp(self, code):
+        return self._read("get", code)
+
+    def get_vcp_many(self, codes):
+        return self._read("get_many", tuple(codes))
+
+    def get_capabilities(self):
+        return self._read("capabilities", "capabilities")
+
+    def get_edid(self):
+        # Not a DDC/CI transaction, so it does not queue behind the bus
+        return self.backend.get_edid()
+
+    def set_vcp(self, code, value):
+        priority = DDC_PRIORITY_POWER if code == DDC_FEATURE_POWER else DDC_PRIORITY_WRITE
+        with self.cond:
+            self._invalidate_reads([code])
+            job = self._enqueue("set", code, value, priority)
+        return job.wait(DDC_JOB_TIMEOUT)
+
+    def run_batch(self, steps, stop_on_error=True):
+        """Run the steps as one job, so no other operation gets onto the bus between them"""
+        written = [code for op, code, _ in steps if op == "set"]
+        if DDC_FEATURE_POWER in written:
+            priority = DDC_PRIORITY_POWER
+        elif written:
+            priority = DDC_PRIORITY_WRITE
+        else:
+            priority = DDC_PRIORITY_READ
+        with self.cond:
+            self._invalidate_reads(written)
+            job = self._enqueue("batch", tuple(code for _, code, _ in steps), (steps, stop_on_error), priority)
+        return job.wait(DDC_JOB_TIMEOUT)
+
+    def clear_shared(self):
+        """Forget whether this thread's earlier reads were shared (call per request)"""
+        self.local.shared = False
+
+    def read_shared(self):
+        """Whether a read on this thread since clear_shared() shared another caller's bus operation"""
+        return getattr(self.local, "shared", False)
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self):
+        """Queue depth and wait-time metrics"""
+        with self.cond:
+            completed = self.metrics["completed"] + self.metrics["failed"]
+            return {
+                "backend": self.name,
+                "depth": len(self.queue),
+                "max_depth": self.metrics["max_depth"],
+                "completed": self.metrics["completed"],
+                "failed": self.metrics["failed"],
+                "shared_reads": self.metrics["shared_reads"],
+                "invalidated_reads": self.metrics["invalidated_reads"],
+                "avg_wait_ms": round(self.metrics["total_wait"] / completed * 1000, 2) if completed else 0.0,
+                "max_wait_ms": round(self.metrics["max_wait"] * 1000, 2),
+            }
+
+    def _read(self, op, code):
+        """Queue a read, or share an identical read that is queued or in progress"""
+        with self.cond:
+            job = self.flights.get(code)
+            if job:
+                job.waiters += 1
+                self.metrics["shared_reads"] += 1
+            else:
+                job = self._enqueue(op, code, None, DDC_PRIORITY_READ)
+                self.flights[code] = job
+        try:
+            return job.wait(DDC_JOB_TIMEOUT)
+        finally:
+            # A finished job takes no more waiters, so this also marks the caller that started it
+            if job.waiters > 1:
+                self.local.shared = True
+
+    def _call(self, job):
+        if job.op == "get":
+            return self.backend.get_vcp(job.code)
+        if job.op == "get_many":
+            return self.backend.get_vcp_many(job.code)
+        if job.op == "batch":
+            return self.backend.run_batch(*job.value)
+        if job.op == "capabilities":
+            return self.backend.get_capabilities()
+        return self.backend.set_vcp(job.code, job.value)
+
+    def _execute(self, job):
+        """Run a job and report the outcome to the breaker"""
+        # NACKs while the monitor wakes are expected, not transient
+        self.backend.retry_transient = not self.breaker.in_grace()
+        try:
+            result = self._call(job)
+        except DdcUnsupportedError:
+            self.breaker.record_success()  # The monitor answered
+            raise
+        except DdcError as e:
+            self.breaker.record_failure(e)
+            raise
+        except Exception as e:
+            error = DdcError(str(e))
+            self.breaker.record_failure(error)
+            raise error
+
+        errors = []
+        if job.op == "batch":
+            errors = [error for _, error, _ in result if error and error.kind != "unsupported"]
+        if errors:
+            self.breaker.record_failure(errors[0])
+        else:
+            self.breaker.record_success()
+        return result
+
+    def _invalidate_reads(self, codes):
+        """Detach in-flight reads of features about to be written; caller must hold self.cond"""
+        for key in [key for key in self.flights if key in codes or (isinstance(key, tuple) and set(key) & set(codes))]:
+            # Readers already waiting keep the job; new ones start a read ordered after this write
+            del self.flights[key]
+            self.metrics["invalidated_reads"] += 1
+
+    def _enqueue(self, op, code, value, priority):
+        """Queue a job; caller must hold self.cond"""
+        job = DdcJob(op, code, value, priority)
+        heapq.heappush(self.queue, (priority, next(self.sequence), job))
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], len(self.queue))
+        self.cond.notify()
+        return job
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                _, _, job = heapq.heappop(self.queue)
+                job.started = True
+                wait = time.monotonic() - job.enqueued
+
+            if job.op == "batch":
+                labels = (("op", job.op), ("code", "batch"))
+            else:
+                labels = (("op", job.op), ("code", job.code if isinstance(job.code, str) else ",".join(job.code)))
+            metrics.observe("monitor_ddc_queue_wait_seconds", wait)
+            job.phases["ddc-queue"] = wait
+            timing_context.phases = job.phases
+            started = time.perf_counter()
+            if not self.breaker.allow():
+                job.error = DdcCircuitOpenError(
+                    f"Monitor is not answering DDC/CI (circuit breaker open, next try in {self.breaker.retry_in():.0f}s)"
+                )
+            else:
+                try:
+                    job.result = self._execute(job)
+                except DdcError as e:
+                    job.error = e
+            timing_context.phases = None
+            job.phases["ddc-bus"] = time.perf_counter() - started
+            metrics.observe("monitor_ddc_operation_duration_seconds", job.phases["ddc-bus"], labels)
+            if job.error:
+                metrics.inc("monitor_ddc_operation_errors_total", labels + (("kind", job.error.kind),))
+
+            with self.cond:
+                if self.flights.get(job.code) is job:
+                    del self.flights[job.code]
+                self.metrics["failed" if job.error else "completed"] += 1
+                self.metrics["total_wait"] += wait
+                self.metrics["max_wait"] = max(self.metrics["max_wait"], wait)
+            job.done.set()
+
+
+def create_ddc_backend(kind=DDC_BACKEND):
+    """Build the configured DDC backend, falling back to ddcutil if needed"""
+    if kind == "fake":
+        backend = NativeDdcBackend(FakeI2cDevice(
+            wake_delay=float(os.environ.get("MONITOR_FAKE_WAKE_DELAY", 0)),
+            nack_rate=float(os.environ.get("MONITOR_FAKE_NACK_RATE", 0)),
+            latency=float(os.environ.get("MONITOR_FAKE_LATENCY", 0)),
+        ))
+        backend.name = "fake"
+        return backend
+    if kind == "native":
+        try:
+            return NativeDdcBackend(I2cDevice(f"/dev/i2c-{DDC_BUS}"))
+        except OSError as e:
+            print(f"Warning: Could not open /dev/i2c-{DDC_BUS} ({e}), falling back to ddcutil")
+    return DdcutilBackend(DDC_BUS)
+
+
+class StateCache:
+    """Last known monitor state, written through on every change
+
+    Entries older than the TTL are treated as missing so the next read goes
+    to the bus.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> (value, monotonic timestamp)
+        self.listeners = []  # callback(key, value) on every change of value
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def peek(self, key):
+        """Return the last known value regardless of age, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value):
+        with self.lock:
+            previous = self.entries.get(key)
+            self.entries[key] = (value, time.monotonic())
+        if previous is None or previous[0] != value:
+            for listener in self.listeners:
+                listener(key, value)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def age(self, key):
+        """Seconds since the entry was last written, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return round(time.monotonic() - entry[1], 3)
+
+
+class StateJournal:
+    """Append-only journal of monitor state that survives reboots
+
+    Each change is appended as a JSON line {"t": unix time, "key", "value"}
+    and flushed to the OS immediately, but fsync is batched to at most once
+    per `fsync_interval` so a slider drag doesn't hammer the SD card. Once
+    the journal passes `compact_entries` lines it is rewritten atomically
+    (temp file, fsync, rename) down to the latest value of each key.
+    Replaying keeps the last value per key and skips a torn final line.
+    """
+
+    def __init__(self, path, fsync_interval, compact_entries):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.compact_entries = compact_entries
+        self.lock = threading.Lock()
+        self.values = {}  # key -> (value, unix timestamp)
+        self.entries = 0  # Lines in the journal file
+        self.dirty = False
+        self.last_sync = 0.0
+        self.syncs = 0
+        self.compactions = 0
+        self.file = None
+        self.wakeup = threading.Event()
+        self._replay()
+        try:
+            self.file = open(self.path, 'a')
+        except OSError as e:
+            print(f"Warning: Could not open state journal {self.path}: {e}")
+        threading.Thread(target=self._sync_loop, name="state-journal", daemon=True).start()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.values.get(key)
+        return entry[0] if entry else default
+
+    def record(self, key, value):
+        """Append a change of value; repeats of the recorded value are skipped"""
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None and entry[0] == value:
+                return
+            now = time.time()
+            self.values[key] = (value, now)
+            if self.file is None:
+                return
+            try:
+                with timed_phase("state-file"):
+                    self.file.write(json.dumps({"t": round(now, 3), "key": key, "value": value}) + "\n")
+                    self.file.flush()
+                self.entries += 1
+                self.dirty = True
+                if self.entries > self.compact_entries:
+                    self._compact()
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not write state journal: {e}")
+        self.wakeup.set()
+
+    def close(self):
+        """fsync anything outstanding; call on shutdown"""
+        with self.lock:
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "path": self.path,
+                "entries": self.entries,
+                "syncs": self.syncs,
+                "compactions": self.compactions,
+                "unsynced": self.dirty,
+                "state": {key: {"value": value, "time": datetime.fromtimestamp(t).isoformat(timespec="seconds")}
+                          for key, (value, t) in self.values.items()},
+            }
+
+    def _replay(self):
+        try:
+            with open(self.path, 'rb+') as f:
+                end = 0  # Offset just past the last complete line
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Torn final write from a power cut; cut it off so appends start clean
+                        f.truncate(end)
+                        break
+                    end += len(line)
+                    try:
+                        entry = json.loads(line)
+                        self.values[entry["key"]] = (entry["value"], entry["t"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self.entries += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Could not replay state journal {self.path}: {e}")
+
+    def _sync_loop(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # Batch everything written until fsync_interval after the last sync
+            time.sleep(max(0.0, self.last_sync + self.fsync_interval - time.monotonic()))
+            with self.lock:
+                self._sync()
+
+    def _sync(self):
+        """fsync the journal if it has unsynced writes; caller must hold self.lock"""
+        if not self.dirty or self.file is None:
+            return
+        try:
+            os.fsync(self.file.fileno())
+            self.syncs += 1
+        except OSError as e:
+            print(f"Warning: Could not sync state journal: {e}")
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def _compact(self):
+        """Atomically rewrite the journal as one line per key; caller must hold self.lock"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for key, (value, t) in self.values.items():
+                f.write(json.dumps({"t": round(t, 3), "key": key, "value": value}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        directory = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(directory)  # Make the rename itself durable
+        finally:
+            os.close(directory)
+        self.file.close()
+        self.file = open(self.path, 'a')
+        self.entries = len(self.values)
+        self.dirty = False
+        self.compactions += 1
+
+
+class EventBroadcaster:
+    """Fans server-sent events out to every connected /events client
+
+    Events are formatted once on publish and shared by all subscribers.
+    A subscriber that falls too far behind is dropped; its browser will
+    reconnect and receive a fresh snapshot.
+    """
+
+    def __init__(self, backlog=EVENTS_BACKLOG):
+        self.backlog = backlog
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.sequence = itertools.count(1)
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.backlog)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def close(self):
+        """End every stream, e.g. on shutdown"""
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, set()
+        for subscriber in subscribers:
+            self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        # Replace anything pending with the end-of-stream marker
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait(None)
+
+    def format(self, event, data):
+        return f"id: {next(self.sequence)}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def publish(self, event, data):
+        with self.lock:
+            if not self.subscribers:
+                return
+            message = self.format(event, data)
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    self.subscribers.discard(subscriber)
+                    self._drop(subscriber)
+
+
+class Operation:
+    """A long-running monitor operation that clients can poll"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "running"
+        self.message = None
+        self.result = {}
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def finish(self, success, message, **result):
+        self.status = "succeeded" if success else "failed"
+        self.message = message
+        self.result.update(result)
+        self.finished = time.time()
+        self.done.set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "message": self.message,
+            "result": self.result,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class OperationTracker:
+    """Runs operations in the background, one active operation per kind
 
-    return None, "Could not parse brightness value"
+    Starting a kind that is already running joins the existing operation.
+    """
+
+    def __init__(self, history=OPERATION_HISTORY):
+        self.history = history
+        self.lock = threading.Lock()
+        self.operations = collections.OrderedDict()  # id -> Operation
+        self.active = {}  # kind -> running Operation
+
+    def start(self, kind, target, *args):
+        """Start target(operation, *args) in a thread; returns (operation, joined)"""
+        with self.lock:
+            operation = self.active.get(kind)
+            if operation and not operation.done.is_set():
+                return operation, True
+
+            operation = Operation(kind)
+            self.active[kind] = operation
+            self.operations[operation.id] = operation
+            while len(self.operations) > self.history:
+                self.operations.popitem(last=False)
+        events.publish("operation", operation.to_dict())
+
+        thread = threading.Thread(
+            target=self._run, args=(operation, target, args),
+            name=f"operation-{kind}", daemon=True
+        )
+        thread.start()
+        return operation, False
+
+    def get(self, operation_id):
+        with self.lock:
+            return self.operations.get(operation_id)
+
+    def running(self, kind):
+        """The running operation of this kind, or None"""
+        with self.lock:
+            operation = self.active.get(kind)
+        if operation and not operation.done.is_set():
+            return operation
+        return None
+
+    def _run(self, operation, target, args):
+        try:
+            target(operation, *args)
+        except Exception as e:
+            operation.finish(False, f"Unexpected error: {e}")
+        if not operation.done.is_set():
+            operation.finish(True, "Completed")
+        events.publish("operation", operation.to_dict())
+
+
+class LatestWinsWriter:
+    """Coalesces bursts of writes so that only the newest target is applied
+
+    While one write is in flight, further targets replace each other and
+    the next write applies whichever arrived last. Every caller waits for a
+    write that covers its request and gets that write's result.
+    """
+
+    def __init__(self, apply):
+        self.apply = apply  # apply(value) -> (success, error)
+        self.cond = threading.Condition()
+        self.target = None
+        self.generation = 0  # Requests submitted so far
+        self.applied_generation = 0  # Requests covered by a finished write
+        self.writing = False
+        self.result = (None, False, None)  # (value, success, error) of the last write
+        self.coalesced = 0
+
+    def submit(self, value):
+        """Apply value (or a newer target); returns (applied value, success, error)"""
+        with self.cond:
+            self.generation += 1
+            generation = self.generation
+            if self.target is not None:
+                self.coalesced += 1
+            self.target = value
+            if self.writing:
+                while self.applied_generation < generation:
+                    self.cond.wait()
+                return self.result
+            self.writing = True
+
+        try:
+            while True:
+                with self.cond:
+                    if self.target is None:
+                        return self.result
+                    value, covered = self.target, self.generation
+                    self.target = None
+
+                success, error = self.apply(value)
+
+                with self.cond:
+                    self.result = (value, success, error)
+                    self.applied_generation = covered
+                    self.cond.notify_all()
+        finally:
+            with self.cond:
+                self.writing = False
+                if self.applied_generation < self.generation:
+                    # Only reached if apply() raised: release the waiters
+                    self.result = (value, False, "Brightness write failed")
+                    self.applied_generation = self.generation
+                    self.target = None
+                self.cond.notify_all()
+
+
+class StaticPage:
+    """A page rendered once and served with strong ETags and pre-compressed variants"""
+
+    def __init__(self, body, content_type="text/html; charset=utf-8", max_age=UI_CACHE_MAX_AGE):
+        self.content_type = content_type
+        self.max_age = max_age
+        body = body.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        # encoding -> (body, etag); each representation gets its own strong ETag
+        self.variants = {"identity": (body, digest)}
+        self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), digest + "-gz")
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body), digest + "-br")
+
+    def response(self):
+        """Build the response for the current request, answering 304 on a matching ETag"""
+        encoding = request.accept_encodings.best_match(
+            [e for e in ("br", "gzip") if e in self.variants], default="identity"
+        )
+        body, etag = self.variants[encoding]
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, content_type=self.content_type)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}, must-revalidate"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class WatchdogLogTailer:
+    """Incrementally follows the watchdog log
+
+    Remembers the file offset and inode, parses only bytes appended since
+    the last refresh, and keeps the restart count and last entry in memory.
+    Truncation or rotation starts over on the new file. The position and
+    counters are saved so a restart does not rescan.
+    """
+
+    def __init__(self, path, state_path):
+        self.path = path
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.inode = None
+        self.offset = 0
+        self.head = b""  # First bytes of the file, to spot a replaced file reusing the inode
+        self.restart_count = 0
+        self.last_line = None
+        self._load_state()
+
+    def refresh(self):
+        """Read whatever was appended since the last call; returns False if the log is missing"""
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self._reset(stat.st_ino)
+
+            if stat.st_size == self.offset:
+                return True
+
+            start = self.offset
+            with open(self.path, 'rb') as f:
+                head = f.read(WATCHDOG_HEAD_BYTES)
+                if not head.startswith(self.head[:len(head)]):
+                    # Replaced by a new file that reused the inode
+                    self._reset(stat.st_ino)
+                    start = 0
+                self.head = head
+
+                # Fixed-size blocks keep a first scan of a huge log in bounded memory
+                f.seek(self.offset)
+                remaining = stat.st_size - self.offset
+                partial = b""
+                while remaining > 0:
+                    block = f.read(min(WATCHDOG_SCAN_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    data = partial + block
+                    end = data.rfind(b"\n") + 1
+                    self._parse(data[:end])
+                    self.offset += end
+                    # Carried into the next block; at the end, left for the next refresh
+                    partial = data[end:]
+
+            if self.offset != start:
+                self._save_state()
+            return True
+
+    def status(self):
+        """Last entry and restart count"""
+        if not self.refresh():
+            return {
+                "last_check": "Log file not found",
+                "restart_count": 0
+            }
+
+        with self.lock:
+            if self.last_line is None:
+                return {
+                    "last_check": "No entries yet",
+                    "restart_count": 0
+                }
+            last_line = self.last_line
+            restart_count = self.restart_count
+
+        # Extract just the message part (remove timestamp)
+        # Format: "Day Month DD HH:MM:SS TZ YYYY: message"
+        parts = last_line.split(": ", 1)
+        last_check = parts[1] if len(parts) == 2 else last_line
+
+        return {
+            "last_check": last_check,
+            "restart_count": restart_count
+        }
+
+    def _parse(self, data):
+        """Count restarts and remember the last entry in complete lines; caller must hold self.lock"""
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if "Network down" in line:
+                self.restart_count += 1
+            self.last_line = line
+
+    def _reset(self, inode):
+        """Start over on a rotated or truncated log; caller must hold self.lock"""
+        self.inode = inode
+        self.offset = 0
+        self.head = b""
+        self.restart_count = 0
+        self.last_line = None
+
+    def _load_state(self):
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r') as f:
+                    state = json.load(f)
+                self.inode = state["inode"]
+                self.offset = state["offset"]
+                self.head = bytes.fromhex(state["head"])
+                self.restart_count = state["restart_count"]
+                self.last_line = state["last_line"]
+        except Exception:
+            # Unreadable state just means one full rescan
+            self.inode = None
+
+    def _save_state(self):
+        """Persist position and counters; caller must hold self.lock"""
+        try:
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "inode": self.inode,
+                    "offset": self.offset,
+                    "head": self.head.hex(),
+                    "restart_count": self.restart_count,
+                    "last_line": self.last_line,
+                }, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            # Non-critical error, just log it
+            print(f"Warning: Could not save watchdog log position: {e}")
+
+
+class WakeLatencyTracker:
+    """Learned distribution of how long the monitor takes to wake up
+
+    Samples are seconds from the power-on command until the monitor answered
+    readiness probes consistently. They are persisted so the probe schedule
+    survives restarts.
+    """
+
+    def __init__(self, path, history=WAKE_HISTORY):
+        self.path = path
+        self.lock = threading.Lock()
+        self.samples = collections.deque(maxlen=history)
+        self.timeouts = 0
+        self._load()
+
+    def record(self, seconds):
+        metrics.observe("monitor_wake_latency_seconds", seconds)
+        with self.lock:
+            self.samples.append(round(seconds, 3))
+            samples = list(self.samples)
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(samples, f)
+        except Exception as e:
+            # Non-critical error, just log it
+            print(f"Warning: Could not save wake latency samples: {e}")
+
+    def record_timeout(self):
+        metrics.inc("monitor_wake_timeouts_total")
+        with self.lock:
+            self.timeouts += 1
+
+    def percentile(self, p):
+        """Nearest-rank percentile of the recorded samples, or None"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+    def probe_start_delay(self):
+        """How long to wait after power-on before the first readiness probe
+
+        Starts just before the fastest wakes we normally see, so probing does
+        not hammer a controller that is still booting.
+        """
+        with self.lock:
+            enough = len(self.samples) >= WAKE_MIN_SAMPLES
+        if not enough:
+            return WAKE_PROBE_MIN_DELAY
+        return max(WAKE_PROBE_MIN_DELAY, self.percentile(10) * 0.8)
+
+    def stats(self):
+        with self.lock:
+            samples = list(self.samples)
+            timeouts = self.timeouts
+        stats = {
+            "samples": len(samples),
+            "timeouts": timeouts,
+            "probe_start_delay": round(self.probe_start_delay(), 3),
+        }
+        if samples:
+            stats.update({
+                "last": samples[-1],
+                "min": min(samples),
+                "mean": round(sum(samples) / len(samples), 3),
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "max": max(samples),
+            })
+        return stats
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.samples.extend(float(s) for s in json.load(f))
+        except Exception:
+            pass
+
+
+class CapabilitiesStore:
+    """The monitor's parsed capabilities, persisted per monitor
+
+    `ddcutil capabilities` takes seconds, so the string is read once per
+    monitor and saved keyed by a hash of its EDID; after a restart (or when
+    a known monitor is reconnected) it comes from the file instead. Without
+    an EDID there is no way to tell monitors apart, so the capabilities are
+    only kept in memory until the server exits. Until capabilities are
+    known, supports() returns None and callers let the monitor decide.
+    """
+
+    def __init__(self, path, backend, retry_interval=CAPABILITIES_RETRY_INTERVAL):
+        self.path = path
+        self.backend = backend
+        self.retry_interval = retry_interval
+        self.lock = threading.Lock()
+        self.entries = {}  # EDID key -> {"raw", "model", "mccs_version", "features", "fetched"}
+        self.key = None
+        self.current = None
+        self.source = None
+        self.loading = False
+        self.last_attempt = None
+        self.last_error = None
+        self._load()
+
+    def load(self, refresh=False):
+        """Look up (or read from the monitor) this monitor's capabilities; returns an error or None"""
+        with self.lock:
+            if self.loading:
+                return None
+            self.loading = True
+            self.last_attempt = time.monotonic()
+        try:
+            edid = self.backend.get_edid()
+            key = hashlib.sha256(edid).hexdigest()[:16] if edid else None
+            with self.lock:
+                entry = None if refresh or key is None else self.entries.get(key)
+            source = "saved"
+            if entry is None:
+                raw = self.backend.get_capabilities()
+                entry = dict(parse_capabilities(raw), raw=raw, fetched=time.time())
+                source = "monitor"
+            with self.lock:
+                self.key, self.current, self.source = key, entry, source
+                self.last_error = None
+                if key is not None and source == "monitor":
+                    self.entries[key] = entry
+                    self._save()
+            return None
+        except (DdcError, ValueError) as e:
+            with self.lock:
+                self.last_error = str(e)
+            print(f"Warning: Could not read monitor capabilities: {e}")
+            return str(e)
+        finally:
+            with self.lock:
+                self.loading = False
+
+    def features(self):
+        """{code: accepted values or None}, or None while capabilities are unknown"""
+        with self.lock:
+            current = self.current
+            retry = (
+                current is None and not self.loading
+                and (self.last_attempt is None or time.monotonic() - self.last_attempt > self.retry_interval)
+            )
+        if retry:
+            threading.Thread(target=self.load, name="capabilities", daemon=True).start()
+        return current["features"] if current else None
+
+    def supports(self, code):
+        """True or False per the capabilities string, or None if it is not known yet"""
+        features = self.features()
+        return None if features is None else code in features
+
+    def check(self, code, value=None):
+        """Error message if the monitor does not accept this read (or write of value), else None"""
+        features = self.features()
+        if features is None:
+            return None
+        if code not in features:
+            return f"VCP feature {code} is not supported by this monitor"
+        allowed = features[code]
+        if value is not None and allowed is not None and value not in allowed:
+            return f"VCP feature {code} accepts only {', '.join(f'{v:02x}' for v in allowed)}"
+        return None
+
+    def status(self):
+        with self.lock:
+            current = self.current
+            return {
+                "known": current is not None,
+                "edid_key": self.key,
+                "source": self.source,
+                "model": current["model"] if current else None,
+                "mccs_version": current["mccs_version"] if current else None,
+                "raw": current["raw"] if current else None,
+                "fetched": datetime.fromtimestamp(current["fetched"]).isoformat(timespec="seconds") if current else None,
+                "loading": self.loading,
+                "last_error": self.last_error,
+            }
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+                # Saved by earlier versions for monitors without an EDID
+                self.entries.pop("unknown-edid", None)
+        except Exception:
+            pass
+
+    def _save(self):
+        """Caller must hold self.lock"""
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            # Non-critical error, just log it
+            print(f"Warning: Could not save monitor capabilities: {e}")
+
+
+class SleepWatcher:
+    """Follows Posterr's sleep schedule: monitor off while it sleeps, on when it wakes
+
+    Polls <url>/api/sleep over one keep-alive connection every `interval`
+    seconds, moved randomly by up to `jitter` (a fraction of the interval),
+    and backs off exponentially up to `max_backoff` while Posterr is
+    unreachable. `apply(sleeping)` changes the monitor's power and returns an
+    error message or None; a failed change is retried on the next poll.
+
+    A changed sleep state only reaches the monitor once it has been reported
+    `samples` polls in a row and has lasted `dwell` seconds, with separate
+    thresholds for turning off (`off`) and on (`on`). Changes that revert
+    before then are counted as suppressed.
+    """
+
+    def __init__(self, url, apply, interval, jitter, max_backoff, timeout, off=(1, 0.0), on=(1, 0.0)):
+        parsed = urllib.parse.urlsplit(url)
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path.rstrip("/") + "/api/sleep"
+        self.apply = apply
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.thresholds = {True: off, False: on}  # sleeping -> (samples, dwell seconds)
+        self.conn = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.sleeping = None  # Last state reported by Posterr
+        self.applied = None  # Last state applied to the monitor
+        self.pending = None  # State waiting out its hysteresis thresholds
+        self.pending_since = None
+        self.pending_samples = 0
+        self.suppressed = 0  # Changes that reverted before reaching the monitor
+        self.failures = 0  # Consecutive failed polls
+        self.polls = 0
+        self.poll_errors = 0
+        self.transitions = 0
+        self.last_poll = None
+        self.last_error = None
+        self.next_delay = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="sleepwatch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        print(f"Posterr sleep watcher polling http://{self.host}:{self.port}{self.path}")
+        while not self.stop_event.is_set():
+            try:
+                delay = self.poll()
+            except Exception as e:
+                print(f"Warning: Sleep watcher poll failed: {e}")
+                delay = self.interval
+            with self.lock:
+                self.next_delay = delay
+            self.stop_event.wait(delay)
+        self._close()
+
+    def poll(self):
+        """Check Posterr once, apply any change, and return the delay until the next poll"""
+        sleeping, error = self._fetch()
+        with self.lock:
+            self.polls += 1
+            self.last_poll = time.time()
+            if error:
+                self.poll_errors += 1
+                self.failures += 1
+                self.last_error = error
+            else:
+                self.failures = 0
+                self.sleeping = sleeping
+
+        if error:
+            metrics.inc("monitor_sleepwatch_polls_total", (("result", "error"),))
+            if self.failures == 1:
+                print(f"Warning: {error}")
+            return self._jittered(min(self.max_backoff, self.interval * 2 ** self.failures))
+
+        metrics.inc("monitor_sleepwatch_polls_total", (("result", "ok"),))
+        if self._settled(sleeping):
+            error = self.apply(sleeping)
+            with self.lock:
+                if error:
+                    self.last_error = error
+                else:
+                    self.applied = sleeping
+                    self.pending = None
+                    self.transitions += 1
+            if error:
+                print(f"Warning: {error}")
+            else:
+                metrics.inc("monitor_sleepwatch_transitions_total", (("state", "off" if sleeping else "on"),))
+        return self._jittered(self.interval)
+
+    def _settled(self, sleeping):
+        """Track hysteresis for this sample; True once the monitor should follow it"""
+        with self.lock:
+            if sleeping == self.applied:
+                if self.pending is not None:
+                    self.suppressed += 1
+                    metrics.inc("monitor_sleepwatch_suppressed_total",
+                                (("state", "off" if self.pending else "on"),))
+                    print(f"Ignoring brief Posterr change to {'sleep' if self.pending else 'awake'} "
+                          f"after {self.pending_samples} polls")
+                    self.pending = None
+                return False
+            if self.applied is None:
+                return True  # First answer since startup: nothing to flap from
+
+            now = time.monotonic()
+            if self.pending != sleeping:
+                self.pending = sleeping
+                self.pending_since = now
+                self.pending_samples = 0
+            self.pending_samples += 1
+            samples, dwell = self.thresholds[sleeping]
+            return self.pending_samples >= samples and now - self.pending_since >= dwell
+
+    def status(self):
+        with self.lock:
+            return {
+                "enabled": self.thread is not None,
+                "url": self.url,
+                "sleeping": self.sleeping,
+                "applied": None if self.applied is None else ("off" if self.applied else "on"),
+                "polls": self.polls,
+                "poll_errors": self.poll_errors,
+                "consecutive_failures": self.failures,
+                "transitions": self.transitions,
+                "suppressed": self.suppressed,
+                "pending": None if self.pending is None else ("off" if self.pending else "on"),
+                "pending_samples": self.pending_samples if self.pending is not None else 0,
+                "pending_for": round(time.monotonic() - self.pending_since, 1) if self.pending is not None else None,
+                "last_poll_age": round(time.time() - self.last_poll, 1) if self.last_poll else None,
+                "next_poll_in": round(self.next_delay, 1) if self.next_delay is not None else None,
+                "last_error": self.last_error,
+            }
+
+    def _fetch(self):
+        """Return (sleeping, error) from one GET of /api/sleep"""
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request("GET", self.path)
+            response = self.conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self._close()
+            return None, f"Failed to connect to Posterr API at {self.url}: {e}"
+
+        if response.status != 200:
+            return None, f"Posterr API returned HTTP {response.status}"
+        text = body.decode(errors="replace").strip().lower()
+        if text == "true":
+            return True, None
+        if text == "false":
+            return False, None
+        return None, f"Unexpected Posterr API response: {text[:100]}"
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class MqttBridge:
+    """Mirrors monitor state to an MQTT broker and takes commands from it
+
+    The connection is handled by paho-mqtt on its own thread. State is
+    published retained, on change only, under <prefix>/...; on every
+    (re)connection the bridge announces itself to Home Assistant discovery
+    and republishes a snapshot. Commands arriving on <prefix>/<name>/set run
+    one at a time on a worker thread through the `commands` callbacks, which
+    return an error message or None. While the broker is unreachable, paho
+    reconnects with exponential backoff and at most `buffer_size` outgoing
+    messages are kept (oldest dropped).
+    """
+
+    def __init__(self, host, port, prefix, discovery_prefix, commands, snapshot,
+                 username=None, password=None, keepalive=60, buffer_size=100,
+                 reconnect_min=1, reconnect_max=60):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.discovery_prefix = discovery_prefix
+        self.node_id = re.sub(r"[^A-Za-z0-9_-]", "_", prefix)
+        self.commands = commands  # name -> callback(payload) for <prefix>/<name>/set
+        self.snapshot = snapshot  # () -> [(subtopic, payload)] of current state
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.lock = threading.Lock()
+        self.outbox = collections.deque(maxlen=buffer_size)  # (topic, payload, retain) while disconnected
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mqtt-command")
+        self.client = None
+        self.stopping = False
+        self.connected = False
+        self.connections = 0
+        self.failures = 0  # Failed attempts since the last successful connection
+        self.published = 0
+        self.dropped = 0
+        self.commands_received = 0
+        self.last_error = None
+
+    def start(self):
+        client_id = f"{self.node_id}-{uuid.uuid4().hex[:6]}"
+        if hasattr(paho_mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+            self.client = paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self.client = paho_mqtt.Client(client_id=client_id)
+        if self.username:
+            self.client.username_pw_set(self.username, self.password)
+        self.client.will_set(f"{self.prefix}/availability", "offline", retain=True)
+        self.client.reconnect_delay_set(self.reconnect_min, self.reconnect_max)
+        self.client.on_connect = self._on_connect
+        self.client.on_connect_fail = self._on_connect_fail
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = lambda client, userdata, message: self._command(message.topic, message.payload)
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+
+    def active(self):
+        return self.client is not None
+
+    def stop(self):
+        """Say goodbye to the broker (availability offline) and stop reconnecting"""
+        self.publish("availability", "offline")
+        with self.lock:
+            self.stopping = True
+        self.client.disconnect()  # Sent after anything already queued
+        self.client.loop_stop()
+
+    def publish(self, subtopic, payload, retain=True):
+        """Send a message under the prefix, or buffer it until the broker is connected"""
+        self._publish(f"{self.prefix}/{subtopic}", payload, retain)
+
+    def status(self):
+        with self.lock:
+            return {
+                "enabled": self.active(),
+                "broker": f"{self.host}:{self.port}",
+                "prefix": self.prefix,
+                "connected": self.connected,
+                "connections": self.connections,
+                "published": self.published,
+                "buffered": len(self.outbox),
+                "dropped": self.dropped,
+                "commands": self.commands_received,
+                "last_error": self.last_error,
+            }
+
+    def _publish(self, topic, payload, retain):
+        with self.lock:
+            # paho only queues messages while connected; QoS 0 ones published
+            # while disconnected would be lost, so keep them here instead
+            if self.connected and self.client.publish(topic, payload, retain=retain).rc == paho_mqtt.MQTT_ERR_SUCCESS:
+                self.published += 1
+                return
+            if len(self.outbox) == self.outbox.maxlen:
+                self.dropped += 1
+            self.outbox.append((topic, payload, retain))
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            self._failed(f"Broker refused the connection: {paho_mqtt.connack_string(reason_code)}")
+            return
+        print(f"MQTT connected to {self.host}:{self.port}")
+        client.subscribe([(f"{self.prefix}/{name}/set", 0) for name in self.commands])
+        for topic, config in self._discovery():
+            client.publish(topic, json.dumps(config), retain=True)
+        client.publish(f"{self.prefix}/availability", "online", retain=True)
+        for subtopic, payload in self.snapshot():
+            client.publish(f"{self.prefix}/{subtopic}", payload, retain=True)
+
+        # Under the lock, so nothing newer is published ahead of the backlog
+        with self.lock:
+            self.connected = True
+            self.connections += 1
+            self.failures = 0
+            while self.outbox:
+                topic, payload, retain = self.outbox.popleft()
+                client.publish(topic, payload, retain=retain)
+                self.published += 1
+
+    def _on_connect_fail(self, client, userdata):
+        self._failed(f"Could not connect to {self.host}:{self.port}")
+
+    def _on_disconnect(self, client, userdata, *args):
+        # paho-mqtt 2.x passes (flags, reason_code, properties), 1.x just (rc,)
+        reason_code = args[1] if len(args) == 3 else args[0]
+        if isinstance(reason_code, int):
+            reason_code = paho_mqtt.error_string(reason_code)
+        with self.lock:
+            self.connected = False
+            if self.stopping:
+                return
+        self._failed(f"Disconnected from broker: {reason_code}")
+
+    def _failed(self, error):
+        with self.lock:
+            self.last_error = error
+            self.failures += 1
+            first = self.failures == 1
+        if first:
+            print(f"Warning: MQTT {error}")
+
+    def _command(self, topic, payload):
+        name = topic[len(self.prefix) + 1:].removesuffix("/set")
+        callback = self.commands.get(name)
+        if callback is None:
+            return
+        with self.lock:
+            self.commands_received += 1
+        payload = payload.decode(errors="replace").strip()
+
+        def run():
+            try:
+                error = callback(payload)
+            except Exception as e:
+                error = str(e)
+            if error:
+                print(f"Warning: MQTT command {name} {payload!r} failed: {error}")
+        self.executor.submit(run)
+
+    def _discovery(self):
+        """Home Assistant MQTT discovery: a dimmable light plus watchdog sensors"""
+        device = {
+            "identifiers": [self.node_id],
+            "name": "Posterr Screen",
+            "manufacturer": "Samsung",
+            "model": "S24B300",
+        }
+        common = {"availability_topic": f"{self.prefix}/availability", "device": device}
+        yield f"{self.discovery_prefix}/light/{self.node_id}/display/config", dict(
+            common,
+            name="Display",
+            unique_id=f"{self.node_id}_display",
+            command_topic=f"{self.prefix}/power/set",
+            state_topic=f"{self.prefix}/power/state",
+            payload_on="ON",
+            payload_off="OFF",
+            brightness_command_topic=f"{self.prefix}/brightness/set",
+            brightness_state_topic=f"{self.prefix}/brightness/state",
+            brightness_scale=100,
+        )
+        yield f"{self.discovery_prefix}/sensor/{self.node_id}/wifi_restarts/config", dict(
+            common,
+            name="WiFi restarts",
+            unique_id=f"{self.node_id}_wifi_restarts",
+            state_topic=f"{self.prefix}/watchdog",
+            value_template="{{ value_json.restart_count }}",
+        )
+        yield f"{self.discovery_prefix}/sensor/{self.node_id}/network_check/config", dict(
+            common,
+            name="Last network check",
+            unique_id=f"{self.node_id}_network_check",
+            state_topic=f"{self.prefix}/watchdog",
+            value_template="{{ value_json.last_check }}",
+        )
+
+
+class WebhookSender:
+    """Delivers events to one webhook receiver from a background thread
+
+    `notify()` only queues, so a slow or dead receiver never delays the
+    caller. Events arriving within `batch_window` seconds of each other are
+    POSTed together as {"events": [...]} over one keep-alive connection.
+    Failed deliveries (connection errors, 408, 429 and 5xx) are retried up
+    to `max_attempts` times with jittered exponential backoff; other errors
+    and exhausted batches are dropped and counted. At most `queue_size`
+    events wait; the oldest are dropped first.
+    """
+
+    RETRYABLE_STATUS = {408, 429}
+
+    def __init__(self, url, batch_window=0.5, batch_max=50, queue_size=500,
+                 max_attempts=5, retry_min=1, retry_max=30, timeout=5):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"Invalid webhook URL {url!r}")
+        self.url = url
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += "?" + parsed.query
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self.max_attempts = max_attempts
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.timeout = timeout
+        self.conn = None
+        self.condition = threading.Condition()
+        self.queue = collections.deque(maxlen=queue_size)
+        self.stopping = False
+        self.thread = None
+        self.delivered = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self.connections = 0
+        self.last_error = None
+        self.last_delivery = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="webhook", daemon=True)
+        self.thread.start()
+
+    def notify(self, event, data):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append({
+                "event": event,
+                "time": datetime.now().isoformat(timespec="milliseconds"),
+                "data": data,
+            })
+            self.condition.notify()
+
+    def stop(self, timeout=2):
+        """Deliver what is queued (one attempt, within `timeout`) and stop"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def status(self):
+        with self.condition:
+            return {
+                "url": self.url,
+                "queued": len(self.queue),
+                "delivered": self.delivered,
+                "batches": self.batches,
+                "retries": self.retries,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "connections": self.connections,
+                "last_delivery_age": round(time.time() - self.last_delivery, 1) if self.last_delivery else None,
+                "last_error": self.last_error,
+            }
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.stopping:
+                    self.condition.wait()
+                if not self.queue:
+                    break
+                # Let events that happen close together join this batch
+                deadline = time.monotonic() + self.batch_window
+                while len(self.queue) < self.batch_max and not self.stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = [self.queue.popleft() for _ in range(min(self.batch_max, len(self.queue)))]
+            self._deliver(batch)
+        self._close()
+
+    def _deliver(self, batch):
+        body = json.dumps({"events": batch}).encode()
+        for attempt in range(1, self.max_attempts + 1):
+            error, retryable = self._post(body)
+            with self.condition:
+                if error is None:
+                    self.delivered += len(batch)
+                    self.batches += 1
+                    self.last_delivery = time.time()
+                    self.last_error = None
+                    metrics.inc("monitor_webhook_deliveries_total", (("result", "success"),))
+                    return
+                self.last_error = error
+                stopping = self.stopping
+            if not retryable or stopping or attempt == self.max_attempts:
+                break
+            with self.condition:
+                self.retries += 1
+            metrics.inc("monitor_webhook_deliveries_total", (("result", "retry"),))
+            delay = min(self.retry_max, self.retry_min * 2 ** (attempt - 1))
+            with self.condition:
+                # Shutdown cuts the backoff short
+                self.condition.wait_for(lambda: self.stopping, delay * random.uniform(0.5, 1.0))
+
+        print(f"Warning: Webhook {self.url} dropped {len(batch)} events: {error}")
+        with self.condition:
+            self.failed += len(batch)
+        metrics.inc("monitor_webhook_deliveries_total", (("result", "failed"),))
+
+    def _post(self, body):
+        """Return (error, retryable) from one POST of `body`"""
+        for _ in range(2):
+            fresh = self.conn is None
+            try:
+                if fresh:
+                    self.conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+                    with self.condition:
+                        self.connections += 1
+                self.conn.request("POST", self.path, body, {"Content-Type": "application/json"})
+                response = self.conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self._close()
+                if not fresh:
+                    continue  # The receiver closed the idle keep-alive connection; reconnect once
+                return f"Failed to reach webhook: {e}", True
+
+            if response.will_close:
+                self._close()
+            if 200 <= response.status < 300:
+                return None, False
+            retryable = response.status >= 500 or response.status in self.RETRYABLE_STATUS
+            return f"Webhook returned HTTP {response.status}", retryable
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+os.makedirs(STATE_DIR, exist_ok=True)
+events = EventBroadcaster()
+ddc = DdcWorker(create_ddc_backend())
+state_cache = StateCache(STATE_CACHE_TTL)
+state_journal = StateJournal(STATE_JOURNAL_FILE, STATE_JOURNAL_FSYNC_INTERVAL, STATE_JOURNAL_COMPACT_ENTRIES)
+for key in ("power", "brightness"):
+    # Warm the cache from the journal; verify_replayed_state() checks it against the monitor
+    if state_journal.get(key) is not None:
+        state_cache.set(key, state_journal.get(key))
+state_cache.listeners.append(lambda key, value: publish_state_change(key, value))
+state_cache.listeners.append(lambda key, value: state_journal.record(key, value))
+state_cache.listeners.append(lambda key, value: publish_mqtt_state(key, value))
+state_cache.listeners.append(lambda key, value: notify_webhooks_state(key, value))
+unsupported_vcp_codes = set()  # VCP codes the monitor reported as unsupported
+operations = OperationTracker()
+wake_latency = WakeLatencyTracker(WAKE_STATS_FILE)
+capabilities = CapabilitiesStore(CAPABILITIES_FILE, ddc)
+brightness_writer = LatestWinsWriter(lambda value: apply_brightness(value))
+watchdog_tailer = WatchdogLogTailer(WATCHDOG_LOG, WATCHDOG_STATE_FILE)
+sleep_watcher = SleepWatcher(
+    POSTERR_URL, lambda sleeping: apply_sleep_state(sleeping),
+    SLEEPWATCH_INTERVAL, SLEEPWATCH_JITTER, SLEEPWATCH_MAX_BACKOFF, SLEEPWATCH_TIMEOUT,
+    off=(SLEEPWATCH_OFF_SAMPLES, SLEEPWATCH_OFF_DWELL), on=(SLEEPWATCH_ON_SAMPLES, SLEEPWATCH_ON_DWELL)
+)
+mqtt_bridge = MqttBridge(
+    MQTT_HOST, MQTT_PORT, MQTT_TOPIC_PREFIX, MQTT_DISCOVERY_PREFIX,
+    commands={
+        "power": lambda payload: mqtt_power_command(payload),
+        "brightness": lambda payload: mqtt_brightness_command(payload),
+    },
+    snapshot=lambda: mqtt_snapshot(),
+    username=MQTT_USERNAME, password=MQTT_PASSWORD, keepalive=MQTT_KEEPALIVE,
+    buffer_size=MQTT_OFFLINE_BUFFER, reconnect_min=MQTT_RECONNECT_MIN, reconnect_max=MQTT_RECONNECT_MAX
+)
+webhooks = [
+    WebhookSender(
+        url, WEBHOOK_BATCH_WINDOW, WEBHOOK_BATCH_MAX, WEBHOOK_QUEUE_SIZE,
+        WEBHOOK_MAX_ATTEMPTS, WEBHOOK_RETRY_MIN, WEBHOOK_RETRY_MAX, WEBHOOK_TIMEOUT
+    )
+    for url in WEBHOOK_URLS
+]
+
+
+def wants_fresh():
+    """True if the request asked to bypass the state cache (?fresh=1)"""
+    return request.args.get("fresh", "0").lower() in ("1", "true", "yes")
+
+
+def last_known(key):
+    """Cached value regardless of age, for answering while the circuit breaker is open
+
+    Marks the current response stale (Warning: 110 header).
+    """
+    value = state_cache.peek(key)
+    if value is not None and has_request_context():
+        g.stale = True
+    return value
+
+
+def get_monitor_status(fresh=False):
+    """Query the monitor's current power state, using the cache unless fresh"""
+    if not fresh:
+        is_on = state_cache.get("power")
+        if is_on is not None:
+            return is_on, None
+
+    try:
+        value, _ = ddc.get_vcp(DDC_FEATURE_POWER)
+    except DdcCircuitOpenError as e:
+        is_on = last_known("power")
+        return (is_on, None) if is_on is not None else (None, f"Failed to query monitor: {e}")
+    except DdcError as e:
+        return None, f"Failed to query monitor: {e}"
+
+    is_on = value == DDC_POWER_ON
+    state_cache.set("power", is_on)
+    return is_on, None
+
+
+def set_power(on):
+    """Turn the monitor on or off via the power mode feature"""
+    try:
+        ddc.set_vcp(DDC_FEATURE_POWER, DDC_POWER_ON if on else DDC_POWER_OFF)
+    except DdcError as e:
+        state_cache.invalidate("power")
+        return False, f"Failed to turn {'on' if on else 'off'} monitor: {e}"
+
+    state_cache.set("power", on)
+    return True, None
+
+
+def get_brightness(fresh=False):
+    """Query the monitor's current brightness level, using the cache unless fresh"""
+    if not fresh:
+        brightness = state_cache.get("brightness")
+        if brightness is not None:
+            return brightness, None
+
+    try:
+        brightness, _ = ddc.get_vcp(DDC_FEATURE_BRIGHTNESS)
+    except DdcCircuitOpenError as e:
+        brightness = last_known("brightness")
+        return (brightness, None) if brightness is not None else (None, f"Failed to query brightness: {e}")
+    except DdcError as e:
+        return None, f"Failed to query brightness: {e}"
+
+    state_cache.set("brightness", brightness)
+    return brightness, None
 
 
 def set_brightness(value):
-    """Set the monitor's brightness level via ddcutil"""
+    """Set the monitor's brightness level"""
     # Validate brightness value (0-100)
     try:
         brightness = int(value)
@@ -898,79 +3839,552 @@ def set_brightness(value):
     except ValueError:
         return False, "Invalid brightness value"
 
-    success, stdout, stderr = run_command(
-        f"sudo ddcutil setvcp {DDC_FEATURE_BRIGHTNESS} {brightness} --bus {DDC_BUS}"
-    )
+    try:
+        ddc.set_vcp(DDC_FEATURE_BRIGHTNESS, brightness)
+    except DdcError as e:
+        state_cache.invalidate("brightness")
+        return False, f"Failed to set brightness: {e}"
 
-    if success:
-        return True, None
+    state_cache.set("brightness", brightness)
+    return True, None
+
+
+def apply_brightness(value):
+    """Write a brightness level and remember it for the next power-on"""
+    success, error = set_brightness(value)
+
+    # Save brightness state for future power-on (only if non-zero)
+    if success and value > 0:
+        save_brightness_state(value)
+
+    return success, error
+
+
+def get_monitor_state(fresh=False):
+    """Read power, brightness and STATE_EXTRA_VCP_CODES in one bus session
+
+    Returns ({"is_on", "brightness", "vcp"}, error). Served from the state
+    cache when every value is cached, unless fresh.
+    """
+    codes = [DDC_FEATURE_POWER, DDC_FEATURE_BRIGHTNESS] + list(STATE_EXTRA_VCP_CODES)
+    keys = ["power", "brightness"] + [f"vcp:{code}" for code in STATE_EXTRA_VCP_CODES]
+
+    cached = [state_cache.get(key) for key in keys]
+    missing = [
+        code for code, value in zip(codes, cached)
+        if value is None and code not in unsupported_vcp_codes
+    ]
+    if fresh or missing:
+        try:
+            results = ddc.get_vcp_many(codes)
+        except DdcCircuitOpenError as e:
+            if state_cache.peek("power") is None or state_cache.peek("brightness") is None:
+                return None, f"Failed to query monitor: {e}"
+            return {
+                "is_on": last_known("power"),
+                "brightness": last_known("brightness"),
+                "vcp": {code: state_cache.peek(f"vcp:{code}") for code in STATE_EXTRA_VCP_CODES},
+            }, None
+        except DdcError as e:
+            return None, f"Failed to query monitor: {e}"
+        if DDC_FEATURE_POWER not in results or DDC_FEATURE_BRIGHTNESS not in results:
+            return None, "Monitor did not report power and brightness"
+
+        cached = []
+        for code, key in zip(codes, keys):
+            if code not in results:
+                # Don't go back to the bus for a feature the monitor lacks
+                unsupported_vcp_codes.add(code)
+                cached.append(None)
+                continue
+            value = results[code][0]
+            if code == DDC_FEATURE_POWER:
+                value = value == DDC_POWER_ON
+            state_cache.set(key, value)
+            cached.append(value)
+
+    return {
+        "is_on": cached[0],
+        "brightness": cached[1],
+        "vcp": dict(zip(STATE_EXTRA_VCP_CODES, cached[2:])),
+    }, None
+
+
+def state_event():
+    """Power and brightness as last seen by the server, for /events"""
+    is_on = state_cache.peek("power")
+    return {
+        "state": None if is_on is None else ("on" if is_on else "off"),
+        "is_on": is_on,
+        "brightness": state_cache.peek("brightness"),
+        "age": state_cache.age("power")
+    }
+
+
+def publish_state_change(key, value):
+    """StateCache listener: push power and brightness changes to /events"""
+    if key in ("power", "brightness"):
+        events.publish("state", state_event())
+
+
+def publish_mqtt_state(key, value):
+    """StateCache listener: publish power and brightness changes to MQTT"""
+    if not mqtt_bridge.active():
+        return
+    if key == "power":
+        mqtt_bridge.publish("power/state", "ON" if value else "OFF")
+    elif key == "brightness":
+        mqtt_bridge.publish("brightness/state", str(value))
+
+
+def notify_webhooks(event, data):
+    """Queue an event for every webhook receiver subscribed to it"""
+    if event in WEBHOOK_EVENTS:
+        for sender in webhooks:
+            sender.notify(event, data)
+
+
+def notify_webhooks_state(key, value):
+    """StateCache listener: send power and brightness changes to the webhooks"""
+    if key == "power":
+        notify_webhooks("power", {"is_on": value, "state": "on" if value else "off"})
+    elif key == "brightness":
+        notify_webhooks("brightness", {"brightness": value})
+
+
+def mqtt_snapshot():
+    """Current state, republished whenever the bridge (re)connects"""
+    messages = []
+    is_on = state_cache.peek("power")
+    if is_on is not None:
+        messages.append(("power/state", "ON" if is_on else "OFF"))
+    brightness = state_cache.peek("brightness")
+    if brightness is not None:
+        messages.append(("brightness/state", str(brightness)))
+    messages.append(("watchdog", json.dumps(get_watchdog_status())))
+    return messages
+
+
+def mqtt_power_command(payload):
+    """<prefix>/power/set: ON or OFF, as /on and /off"""
+    if payload.upper() == "ON":
+        _, _, error = power_on()
+    elif payload.upper() == "OFF":
+        _, error = set_power(False)
     else:
-        return False, f"Failed to set brightness: {stderr}"
+        error = f"Unknown power command {payload!r}"
+    return error
 
 
-def save_brightness_state(brightness):
-    """Save the last brightness setting to a file"""
+def mqtt_brightness_command(payload):
+    """<prefix>/brightness/set: 0-100, as /brightness/<value>"""
     try:
-        with open(BRIGHTNESS_STATE_FILE, 'w') as f:
-            f.write(str(brightness))
-    except Exception as e:
-        # Non-critical error, just log it
-        print(f"Warning: Could not save brightness state: {e}")
+        value = int(float(payload))
+    except ValueError:
+        return f"Invalid brightness {payload!r}"
+    if not 0 <= value <= 100:
+        return "Brightness must be between 0 and 100"
+    _, _, error = change_brightness(value)
+    return error
+
+
+def refresh_loop():
+    """Keep /events subscribers, MQTT and webhooks current without per-client bus traffic
+
+    While anyone is subscribed (or the MQTT bridge or webhooks are set up),
+    watches the watchdog log for changes and lets the state cache refresh
+    itself from the bus once it has expired.
+    """
+    last_watchdog = None
+    while True:
+        try:
+            if events.subscriber_count() or mqtt_bridge.active() or webhooks:
+                watchdog = get_watchdog_status()
+                if watchdog != last_watchdog:
+                    events.publish("watchdog", watchdog)
+                    if mqtt_bridge.active():
+                        mqtt_bridge.publish("watchdog", json.dumps(watchdog))
+                    if last_watchdog is not None and watchdog["restart_count"] > last_watchdog["restart_count"]:
+                        notify_webhooks("watchdog_restart", watchdog)
+                    last_watchdog = watchdog
+
+                # Reads the bus only when the cached state has expired; any
+                # change is published by the state cache listener
+                get_monitor_state()
+            else:
+                last_watchdog = None
+        except Exception as e:
+            print(f"Warning: Background refresh failed: {e}")
+        time.sleep(EVENTS_REFRESH_INTERVAL)
+
+
+def save_brightness_state(brightness):
+    """Remember the brightness to restore at the next power-on"""
+    state_journal.record("last_brightness", brightness)
 
 
 def load_brightness_state():
-    """Load the last brightness setting from file"""
-    try:
-        if os.path.exists(BRIGHTNESS_STATE_FILE):
-            with open(BRIGHTNESS_STATE_FILE, 'r') as f:
-                brightness = int(f.read().strip())
-                # Validate range
-                if 0 <= brightness <= 100:
-                    return brightness
-    except Exception:
-        pass
+    """Brightness to restore at power-on, from the state journal"""
+    brightness = state_journal.get("last_brightness")
+    if brightness is None:
+        brightness = import_legacy_brightness_state()
+    if isinstance(brightness, int) and 0 <= brightness <= 100:
+        return brightness
     return DEFAULT_BRIGHTNESS
 
 
-def get_watchdog_status():
-    """Get network watchdog status from log file"""
-    if not os.path.exists(WATCHDOG_LOG):
-        return {
-            "last_check": "Log file not found",
-            "restart_count": 0
-        }
-
+def import_legacy_brightness_state():
+    """Carry over the brightness saved by older versions in /tmp, if still there"""
     try:
-        with open(WATCHDOG_LOG, 'r') as f:
-            lines = f.readlines()
+        with open(LEGACY_BRIGHTNESS_STATE_FILE, 'r') as f:
+            brightness = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    save_brightness_state(brightness)
+    return brightness
+
+
+def verify_replayed_state():
+    """Check the state replayed from the journal against the monitor
+
+    Requests are answered from the replayed state straight away; this
+    corrects it (and notifies /events) if the monitor changed while the
+    server was down, e.g. after a power cut.
+    """
+    if state_cache.peek("power") is None and state_cache.peek("brightness") is None:
+        return
+    _, error = get_monitor_state(fresh=True)
+    if error:
+        print(f"Warning: Could not verify replayed state: {error}")
+
+
+def wait_until_awake(powered_at):
+    """Probe the monitor with cheap VCP reads until it answers consistently
+
+    Returns seconds from power-on until the first probe of the consistent run
+    answered, or None if it never settled within WAKE_TIMEOUT.
+    """
+    time.sleep(max(0, powered_at + wake_latency.probe_start_delay() - time.monotonic()))
+
+    interval = WAKE_PROBE_INTERVAL
+    consecutive = 0
+    ready_since = None
+    while time.monotonic() - powered_at < WAKE_TIMEOUT:
+        # Power and brightness in one bus session: the controller must report
+        # the panel on and answer for the feature we are about to write
+        try:
+            results = ddc.get_vcp_many([DDC_FEATURE_POWER, DDC_FEATURE_BRIGHTNESS])
+            ready = (
+                results.get(DDC_FEATURE_POWER, (None,))[0] == DDC_POWER_ON
+                and DDC_FEATURE_BRIGHTNESS in results
+            )
+        except DdcError:
+            ready = False
+
+        if ready:
+            consecutive += 1
+            if ready_since is None:
+                ready_since = time.monotonic()
+            if consecutive >= WAKE_STABLE_PROBES:
+                return ready_since - powered_at
+            time.sleep(WAKE_PROBE_INTERVAL)
+        else:
+            # Back off while the controller is still booting
+            consecutive = 0
+            ready_since = None
+            time.sleep(interval)
+            interval = min(interval * 2, WAKE_PROBE_MAX_INTERVAL)
 
-        if not lines:
-            return {
-                "last_check": "No entries yet",
-                "restart_count": 0
-            }
+    return None
 
-        # Count restart events (lines containing "Network down")
-        restart_count = sum(1 for line in lines if "Network down" in line)
 
-        # Get the last line (most recent entry)
-        last_line = lines[-1].strip()
+def wake_monitor(operation):
+    """Power the monitor on, wait until it is ready, then apply brightness
 
-        # Extract just the message part (remove timestamp)
-        # Format: "Day Month DD HH:MM:SS TZ YYYY: message"
-        if ": " in last_line:
-            parts = last_line.split(": ", 1)
-            if len(parts) == 2:
-                last_check = parts[1]
+    The target brightness is read from the operation after the wait so that
+    requests joining a running wake can change it.
+    """
+    success, error = set_power(True)
+    if not success:
+        operation.finish(False, error)
+        return
+    powered_at = time.monotonic()
+
+    # The monitor ignores DDC/CI while it wakes; don't let that open the breaker
+    ddc.breaker.start_grace(WAKE_TIMEOUT)
+    wake_seconds = wait_until_awake(powered_at)
+    ddc.breaker.end_grace()
+    if wake_seconds is None:
+        # Never settled - try the brightness anyway, as the fixed delay used to
+        wake_latency.record_timeout()
+    else:
+        wake_latency.record(wake_seconds)
+
+    brightness = operation.result.get("target_brightness") or load_brightness_state()
+    if brightness > 0:  # Only set if non-zero
+        success, error = set_brightness(brightness)
+        if not success:
+            operation.finish(False, error)
+            return
+        save_brightness_state(brightness)
+
+    operation.finish(
+        True, "Monitor turned on", state="on", brightness=brightness,
+        wake_seconds=round(wake_seconds, 3) if wake_seconds is not None else None
+    )
+
+
+def start_wake(brightness=None):
+    """Start (or join) the background wake operation"""
+    operation, joined = operations.start("wake", wake_monitor)
+    if brightness:
+        operation.result["target_brightness"] = brightness
+    return operation, joined
+
+
+def power_on():
+    """Turn the monitor on, as /on does
+
+    Returns (operation, joined, error). If the monitor was off (or is still
+    waking up) the wake and brightness restore run in the background and
+    operation is the running wake; otherwise the power command is repeated.
+    """
+    is_on, error = get_monitor_status()
+    if is_on is False or error or operations.running("wake"):
+        operation, joined = start_wake()
+        return operation, joined, None
+
+    # Already on - just repeat the power command
+    _, error = set_power(True)
+    return None, False, error
+
+
+def change_brightness(value):
+    """Set brightness, as /brightness/<value> does
+
+    Returns (operation, applied, error). Waking from brightness 0 (or during
+    a wake) starts or joins the background wake, which applies the value once
+    the monitor is ready; operation is that wake. Otherwise applied is the
+    level actually written, which may be a newer request's.
+    """
+    # Check if we're waking from sleep (brightness 0 -> non-zero)
+    if value > 0:
+        current_brightness, _ = get_brightness()
+
+        # If display is off (brightness 0) or already waking, wake it and apply
+        # the brightness in the background once it is ready
+        if current_brightness == 0 or operations.running("wake"):
+            operation, _ = start_wake(brightness=value)
+            return operation, None, None
+
+    # If newer targets arrive while a write is in flight only the latest is
+    # applied and every caller gets its result
+    applied, success, error = brightness_writer.submit(value)
+    return None, applied, None if success else error
+
+
+def parse_vcp_code(code):
+    """Normalize "0x14", "14" or "D6" to the two-digit form, or None if invalid"""
+    code = code.lower().removeprefix("0x")
+    return code.zfill(2) if re.fullmatch(r"[0-9a-f]{1,2}", code) else None
+
+
+def parse_batch(body):
+    """Validate a /batch body; returns ([(op, code, value)], stop_on_error, error)"""
+    if not isinstance(body, dict) or not isinstance(body.get("steps"), list):
+        return None, None, 'Expected a JSON object with a "steps" list'
+    if not body["steps"]:
+        return None, None, "No steps given"
+    if len(body["steps"]) > BATCH_MAX_STEPS:
+        return None, None, f"At most {BATCH_MAX_STEPS} steps per batch"
+
+    steps = []
+    for i, step in enumerate(body["steps"], 1):
+        if not isinstance(step, dict):
+            return None, None, f"Step {i}: expected an object"
+        op = step.get("op", "set" if "value" in step else "get")
+        code = parse_vcp_code(str(step.get("code", "")))
+        value = step.get("value")
+        if op not in ("get", "set"):
+            return None, None, f"Step {i}: op must be get or set"
+        if code is None:
+            return None, None, f"Step {i}: code must be a VCP feature code such as \"10\" or \"d6\""
+        if op == "set" and (not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= 0xFFFF):
+            return None, None, f"Step {i}: value must be an integer between 0 and 65535"
+        error = capabilities.check(code, value if op == "set" else None)
+        if error:
+            return None, None, f"Step {i}: {error}"
+        steps.append((op, code, value if op == "set" else None))
+    return steps, bool(body.get("stop_on_error", True)), None
+
+
+def remember_vcp(code, value):
+    """Update the state cache with a VCP value read or written outside the usual paths"""
+    if code == DDC_FEATURE_POWER:
+        state_cache.set("power", value == DDC_POWER_ON)
+    elif code == DDC_FEATURE_BRIGHTNESS:
+        state_cache.set("brightness", value)
+    elif code in STATE_EXTRA_VCP_CODES:
+        state_cache.set(f"vcp:{code}", value)
+
+
+def forget_vcp(code):
+    """Drop a cached VCP value after a failed write left it unknown"""
+    if code == DDC_FEATURE_POWER:
+        state_cache.invalidate("power")
+    elif code == DDC_FEATURE_BRIGHTNESS:
+        state_cache.invalidate("brightness")
+    elif code in STATE_EXTRA_VCP_CODES:
+        state_cache.invalidate(f"vcp:{code}")
+
+
+def run_vcp_batch(steps, stop_on_error=True):
+    """Run /batch steps in order; returns (per-step results, wake seconds or None)
+
+    Steps go to the bus worker as one job, so nothing else reaches the monitor
+    between them. A power-on of a monitor that may be off ends the job: the
+    monitor ignores DDC/CI while it wakes, so the remaining steps run as a
+    second job once wait_until_awake() says it is ready.
+    """
+    segments = [[]]
+    is_on = state_cache.get("power")
+    for step in steps:
+        segments[-1].append(step)
+        op, code, value = step
+        if op == "set" and code == DDC_FEATURE_POWER:
+            if value == DDC_POWER_ON and is_on is not True:
+                segments.append([])
+            is_on = value == DDC_POWER_ON
+    segments = [segment for segment in segments if segment]
+
+    results = []
+    wake_seconds = None
+    stopped = False
+    for n, segment in enumerate(segments):
+        if stopped:
+            results.extend({"op": op, "code": code, "status": "skipped", "ok": False, "error": None}
+                           for op, code, _ in segment)
+            continue
+        try:
+            outcomes = ddc.run_batch(segment, stop_on_error)
+        except DdcError as e:
+            outcomes = [(None, e, 0.0)]
+
+        for i, (op, code, value) in enumerate(segment):
+            step = {"op": op, "code": code}
+            if op == "set":
+                step["value"] = value
+            if i >= len(outcomes):
+                step.update(status="skipped", ok=False, error=None)
+                stopped = True
             else:
-                last_check = last_line
-        else:
-            last_check = last_line
+                result, error, seconds = outcomes[i]
+                step["ms"] = round(seconds * 1000, 2)
+                if error:
+                    step.update(status="error", ok=False, error=str(error))
+                    stopped = stopped or stop_on_error
+                    if op == "set":
+                        forget_vcp(code)
+                else:
+                    step.update(status="success", ok=True, error=None)
+                    if op == "get":
+                        step["value"], step["maximum"] = result
+                    remember_vcp(code, step["value"])
+                    if op == "set" and code == DDC_FEATURE_BRIGHTNESS and value > 0:
+                        save_brightness_state(value)
+            results.append(step)
+
+        if n < len(segments) - 1 and results[-1]["status"] == "success":
+            # This segment ended with a power-on: wait for the monitor before the rest
+            powered_at = time.monotonic()
+            ddc.breaker.start_grace(WAKE_TIMEOUT)
+            wake_seconds = wait_until_awake(powered_at)
+            ddc.breaker.end_grace()
+            if wake_seconds is None:
+                wake_latency.record_timeout()
+            else:
+                wake_latency.record(wake_seconds)
 
-        return {
-            "last_check": last_check,
-            "restart_count": restart_count
-        }
+    return results, wake_seconds
+
+
+def apply_sleep_state(sleeping):
+    """Sleep watcher transition, through the same code path as /off and /on"""
+    if sleeping:
+        print(f"{datetime.now()}: Sleep mode active - turning monitor OFF")
+        _, error = set_power(False)
+    else:
+        print(f"{datetime.now()}: Sleep mode inactive - turning monitor ON")
+        _, _, error = power_on()
+    return error
+
+
+def accepted_response(operation, message, **fields):
+    """202 response pointing the client at a background operation"""
+    response = jsonify({
+        "status": "accepted",
+        "message": message,
+        "operation_id": operation.id,
+        "operation": operation.to_dict(),
+        **fields
+    })
+    response.status_code = 202
+    response.headers["Location"] = f"/operations/{operation.id}"
+    return response
+
+
+def read_lines_before(path, num_lines, before=None, block_size=WATCHDOG_BLOCK_SIZE):
+    """Read the last num_lines non-blank lines ending before a byte offset
+
+    Seeks backwards from `before` (default: end of file) in fixed-size
+    blocks, so memory stays proportional to the lines returned rather than
+    the file size. Returns (lines newest first, cursor) where cursor is the
+    byte offset of the oldest returned line, to pass back as `before` for
+    the next page, or None once the start of the file has been reached.
+    """
+    lines = []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size if before is None else max(0, min(before, size))
+
+        position = end
+        buffer = b""  # Bytes [position, position + len(buffer)) not yet split into lines
+        while len(lines) < num_lines:
+            if position == 0:
+                # The remaining buffer is the first line of the file
+                parts, buffer = [buffer], b""
+                line_end = len(parts[0])
+            else:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                buffer = f.read(read_size) + buffer
+                line_end = position + len(buffer)
+                parts = buffer.split(b"\n")
+                # The first part may continue in the previous block
+                buffer = parts.pop(0)
+
+            for part in reversed(parts):
+                start = line_end - len(part)
+                line_end = start - 1  # Skip the newline before this line
+                line = part.decode("utf-8", errors="replace").strip()
+                if line:
+                    lines.append(line)
+                    if len(lines) == num_lines:
+                        return lines, start if start > 0 else None
+
+            if position == 0 and not buffer:
+                break
+
+    return lines, None
+
+
+def get_watchdog_status():
+    """Get network watchdog status from log file"""
+    try:
+        with timed_phase("watchdog-log"):
+            return watchdog_tailer.status()
     except Exception as e:
         return {
             "last_check": f"Error reading log: {str(e)}",
@@ -978,52 +4392,103 @@ def get_watchdog_status():
         }
 
 
-def get_watchdog_log(num_lines=20):
-    """Get recent watchdog log entries"""
+def get_watchdog_log(num_lines=20, before=None):
+    """Get recent watchdog log entries (most recent first) and the cursor for older ones"""
     if not os.path.exists(WATCHDOG_LOG):
-        return []
+        return [], None
 
     try:
-        with open(WATCHDOG_LOG, 'r') as f:
-            lines = f.readlines()
-
-        # Return last N lines, reversed (most recent first)
-        recent_lines = lines[-num_lines:] if len(lines) > num_lines else lines
-        return [line.strip() for line in reversed(recent_lines)]
+        with timed_phase("watchdog-log"):
+            return read_lines_before(WATCHDOG_LOG, num_lines, before)
     except Exception as e:
-        return [f"Error reading log: {str(e)}"]
+        return [f"Error reading log: {str(e)}"], None
+
+
+threading.Thread(target=refresh_loop, name="refresh", daemon=True).start()
+threading.Thread(target=verify_replayed_state, name="replay-check", daemon=True).start()
+threading.Thread(target=capabilities.load, name="capabilities", daemon=True).start()
+if SLEEPWATCH_ENABLED:
+    sleep_watcher.start()
+if MQTT_HOST and paho_mqtt is None:
+    print("Warning: MONITOR_MQTT_HOST is set but paho-mqtt is not installed (apt install python3-paho-mqtt); MQTT bridge disabled")
+elif MQTT_HOST:
+    mqtt_bridge.start()
+for sender in webhooks:
+    sender.start()
+
+metrics.gauge("monitor_ddc_breaker_state", "DDC circuit breaker state (0 closed, 1 half-open, 2 open)",
+              lambda: CircuitBreaker.STATES[ddc.breaker.state])
+metrics.gauge("monitor_ddc_queue_depth", "DDC operations waiting for the bus worker",
+              lambda: ddc.stats()["depth"])
+metrics.gauge("monitor_ddc_shared_reads", "Bus reads saved by sharing an identical in-flight read",
+              lambda: ddc.stats()["shared_reads"])
+metrics.gauge("monitor_brightness_writes_coalesced", "Brightness targets superseded before being written",
+              lambda: brightness_writer.coalesced)
+metrics.gauge("monitor_watchdog_restarts", "WiFi restarts ('Network down' entries) in the current watchdog log",
+              lambda: get_watchdog_status()["restart_count"])
+metrics.gauge("monitor_event_subscribers", "Connected /events clients", lambda: events.subscriber_count())
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    timing_context.phases = {} if SERVER_TIMING else None
+    ddc.clear_shared()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        # Label by route pattern, not path, to keep cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("monitor_http_request_duration_seconds", time.perf_counter() - started,
+                        (("endpoint", endpoint),))
+        metrics.inc("monitor_http_requests_total",
+                    (("endpoint", endpoint), ("method", request.method), ("status", str(response.status_code))))
+
+    phases = getattr(timing_context, "phases", None)
+    if phases is not None and started is not None:
+        phases["total"] = time.perf_counter() - started
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()
+        )
+    timing_context.phases = None
+    if getattr(g, "stale", False):
+        # Answered from the last known state because the monitor is not answering
+        response.headers["Warning"] = '110 - "Response is Stale"'
+    return response
+
+
+# The web UI is static: render it once at startup instead of on every hit
+with app.app_context():
+    index_page = StaticPage(render_template_string(HTML_TEMPLATE))
 
 
 @app.route('/', methods=['GET'])
 def index():
     """Serve the web control interface"""
-    return render_template_string(HTML_TEMPLATE)
+    return index_page.response()
 
 
 @app.route('/on', methods=['GET'])
 def turn_on():
     """Turn the monitor on and restore last brightness"""
-    # Check if monitor is currently off
-    is_on, error = get_monitor_status()
+    operation, joined, error = power_on()
 
-    # Turn on the monitor
-    success, stdout, stderr = run_command(MONITOR_ON_SCRIPT)
+    if operation:
+        return accepted_response(
+            operation,
+            "Monitor is already waking up" if joined else "Monitor waking up",
+            state="on"
+        )
 
-    if not success:
+    if error:
         return jsonify({
             "status": "error",
-            "message": f"Failed to turn on monitor: {stderr}"
+            "message": error
         }), 500
 
-    # If monitor was off, wait for it to initialize then restore brightness
-    if is_on is False or error:  # Was off or couldn't determine status
-        time.sleep(5.0)  # Wait for display to fully wake up
-
-        # Restore last known brightness
-        last_brightness = load_brightness_state()
-        if last_brightness > 0:  # Only set if non-zero
-            set_brightness(last_brightness)
-
     return jsonify({
         "status": "success",
         "message": "Monitor turned on",
@@ -1034,7 +4499,7 @@ def turn_on():
 @app.route('/off', methods=['GET'])
 def turn_off():
     """Turn the monitor off"""
-    success, stdout, stderr = run_command(MONITOR_OFF_SCRIPT)
+    success, error = set_power(False)
 
     if success:
         return jsonify({
@@ -1045,14 +4510,14 @@ def turn_off():
     else:
         return jsonify({
             "status": "error",
-            "message": f"Failed to turn off monitor: {stderr}"
+            "message": error
         }), 500
 
 
 @app.route('/status', methods=['GET'])
 def status():
     """Get the current monitor power state"""
-    is_on, error = get_monitor_status()
+    is_on, error = get_monitor_status(fresh=wants_fresh())
 
     if error:
         return jsonify({
@@ -1063,23 +4528,129 @@ def status():
     return jsonify({
         "status": "success",
         "state": "on" if is_on else "off",
-        "is_on": is_on
+        "is_on": is_on,
+        "age": state_cache.age("power"),
+        "shared": ddc.read_shared()
     }), 200
 
 
+@app.route('/state', methods=['GET'])
+def state():
+    """Get power, brightness and watchdog status in one request"""
+    monitor_state, error = get_monitor_state(fresh=wants_fresh())
+
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 500
+
+    return jsonify({
+        "status": "success",
+        "state": "on" if monitor_state["is_on"] else "off",
+        "is_on": monitor_state["is_on"],
+        "brightness": monitor_state["brightness"],
+        "vcp": monitor_state["vcp"],
+        "watchdog": get_watchdog_status(),
+        "age": state_cache.age("power"),
+        "shared": ddc.read_shared()
+    }), 200
+
+
+@app.route('/events', methods=['GET'])
+def event_stream():
+    """Server-Sent Events stream of power, brightness, watchdog and operation changes"""
+    if events.subscriber_count() >= EVENTS_MAX_CLIENTS:
+        return jsonify({
+            "status": "error",
+            "message": "Too many event stream clients"
+        }), 503
+
+    def stream():
+        # Start every client with a snapshot; use whatever is cached, so
+        # extra tabs cost no bus traffic
+        if state_cache.peek("power") is None:
+            get_monitor_state()
+
+        subscriber = events.subscribe()
+        try:
+            yield events.format("state", state_event())
+            yield events.format("watchdog", get_watchdog_status())
+
+            while True:
+                try:
+                    message = subscriber.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:  # Dropped for falling behind, or shutting down
+                    return
+                yield message
+        finally:
+            events.unsubscribe(subscriber)
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics"""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route('/debug/profile', methods=['GET'])
+def profile_endpoint():
+    """Sample all thread stacks for ?seconds=N and return folded stacks for a flamegraph"""
+    if not PROFILER_ENABLED:
+        return jsonify({
+            "status": "error",
+            "message": "Profiler is disabled (set MONITOR_PROFILER=1)"
+        }), 404
+
+    try:
+        seconds = min(float(request.args.get("seconds", 10)), PROFILER_MAX_SECONDS)
+        interval = max(float(request.args.get("interval", 0.01)), 0.001)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "seconds and interval must be numbers"
+        }), 400
+
+    folded = profiler.profile(seconds, interval)
+    if folded is None:
+        return jsonify({
+            "status": "error",
+            "message": "A profile is already running"
+        }), 409
+
+    return Response(folded, content_type="text/plain; charset=utf-8")
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    breaker = ddc.breaker.status()
     return jsonify({
-        "status": "healthy",
-        "service": "monitor-http-server"
+        "status": "healthy" if breaker["state"] == "closed" else "degraded",
+        "service": "monitor-http-server",
+        "ddc_backend": ddc.name,
+        "ddc_queue": ddc.stats(),
+        "ddc_breaker": breaker,
+        "brightness_writes_coalesced": brightness_writer.coalesced,
+        "state_journal": state_journal.stats(),
+        "capabilities": capabilities.status(),
+        "mqtt": mqtt_bridge.status(),
+        "webhooks": [sender.status() for sender in webhooks]
     }), 200
 
 
 @app.route('/brightness', methods=['GET'])
 def get_brightness_endpoint():
     """Get the current monitor brightness level"""
-    brightness, error = get_brightness()
+    brightness, error = get_brightness(fresh=wants_fresh())
 
     if error:
         return jsonify({
@@ -1089,46 +4660,233 @@ def get_brightness_endpoint():
 
     return jsonify({
         "status": "success",
-        "brightness": brightness
+        "brightness": brightness,
+        "age": state_cache.age("brightness"),
+        "shared": ddc.read_shared()
     }), 200
 
 
 @app.route('/brightness/<int:value>', methods=['GET'])
 def set_brightness_endpoint(value):
     """Set the monitor brightness level (0-100)"""
-    # Check if we're waking from sleep (brightness 0 -> non-zero)
-    if value > 0:
-        current_brightness, _ = get_brightness()
+    if value > 100:
+        return jsonify({
+            "status": "error",
+            "message": "Brightness must be between 0 and 100"
+        }), 400
 
-        # If display is off (brightness 0), turn it on first and wait for it to wake
-        if current_brightness == 0:
-            # Turn on the display first
-            run_command(MONITOR_ON_SCRIPT)
+    operation, applied, error = change_brightness(value)
 
-            # Wait for display to fully wake up before setting brightness
-            # Adjust this delay if needed - testing to find minimum stable delay
-            time.sleep(5.0)
+    if operation:
+        return accepted_response(
+            operation, f"Monitor waking up, brightness will be set to {value}",
+            brightness=value
+        )
 
-    # Now set the desired brightness
-    success, error = set_brightness(value)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
 
-    if not success:
+    brightness = applied
+    confirm = request.args.get("confirm", "0").lower() in ("1", "true", "yes")
+    if confirm or BRIGHTNESS_CONFIRM_READBACK:
+        # Read the new brightness back from the monitor to confirm
+        read_back, get_error = get_brightness(fresh=True)
+        if not get_error:
+            brightness = read_back
+
+    return jsonify({
+        "status": "success",
+        "message": f"Brightness set to {applied}",
+        "brightness": brightness,
+        "superseded": applied != value
+    }), 200
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Run an ordered list of VCP reads and writes in one bus session"""
+    steps, stop_on_error, error = parse_batch(request.get_json(silent=True))
+    if error:
         return jsonify({
             "status": "error",
             "message": error
         }), 400
 
-    # Save brightness state for future power-on (only if non-zero)
-    if value > 0:
-        save_brightness_state(value)
+    started = time.perf_counter()
+    results, wake_seconds = run_vcp_batch(steps, stop_on_error)
+    failed = [step for step in results if step["status"] == "error"]
+    succeeded = [step for step in results if step["ok"]]
+
+    response = {
+        "status": "success",
+        "steps": results,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        "wake_seconds": round(wake_seconds, 3) if wake_seconds is not None else None
+    }
+    if not succeeded:
+        # Nothing reached the monitor: fail like the single-feature endpoints
+        response.update(status="error", message=f"All {len(results)} steps failed: {failed[0]['error']}")
+        return jsonify(response), 500
+    if failed:
+        # Which steps the monitor refused is in each step's ok and error
+        response.update(status="partial", message=f"{len(failed)} of {len(results)} steps failed")
+    return jsonify(response)
+
+
+@app.route('/vcp', methods=['GET'])
+def vcp_features():
+    """List the VCP features the monitor supports (?refresh=1 re-reads its capabilities)"""
+    if request.args.get("refresh", "0").lower() in ("1", "true", "yes"):
+        error = capabilities.load(refresh=True)
+        if error:
+            return jsonify({
+                "status": "error",
+                "message": f"Failed to read capabilities: {error}"
+            }), 500
+
+    features = capabilities.features() or {}
+    return jsonify({
+        "status": "success",
+        "capabilities": capabilities.status(),
+        "features": {
+            code: {"name": VCP_FEATURE_NAMES.get(code), "values": values}
+            for code, values in sorted(features.items())
+        }
+    }), 200
+
+
+@app.route('/vcp/<code>', methods=['GET'])
+def get_vcp_endpoint(code):
+    """Read any VCP feature the monitor supports"""
+    code = parse_vcp_code(code)
+    if code is None:
+        return jsonify({
+            "status": "error",
+            "message": "Invalid VCP feature code"
+        }), 400
+    error = capabilities.check(code)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 404
+
+    try:
+        value, maximum = ddc.get_vcp(code)
+    except DdcUnsupportedError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 404
+    except DdcError as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to read VCP feature {code}: {e}"
+        }), 500
+    remember_vcp(code, value)
+
+    features = capabilities.features() or {}
+    return jsonify({
+        "status": "success",
+        "code": code,
+        "name": VCP_FEATURE_NAMES.get(code),
+        "value": value,
+        "maximum": maximum,
+        "values": features.get(code),
+        "shared": ddc.read_shared()
+    }), 200
+
+
+@app.route('/vcp/<code>/<int:value>', methods=['POST'])
+def set_vcp_endpoint(code, value):
+    """Write any VCP feature the monitor supports; power and brightness go through /on and /brightness
+
+    POST only: features such as 04 (factory reset) must not be triggered by a
+    link prefetch or a crawler following a URL.
+    """
+    code = parse_vcp_code(code)
+    if code is None or value > 0xFFFF:
+        return jsonify({
+            "status": "error",
+            "message": "Invalid VCP feature code or value"
+        }), 400
+    if capabilities.supports(code) is False:
+        return jsonify({
+            "status": "error",
+            "message": f"VCP feature {code} is not supported by this monitor"
+        }), 404
+    error = capabilities.check(code, value)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+
+    if code == DDC_FEATURE_POWER and value == DDC_POWER_ON:
+        return turn_on()
+    if code == DDC_FEATURE_BRIGHTNESS:
+        return set_brightness_endpoint(value)
+
+    try:
+        ddc.set_vcp(code, value)
+    except DdcError as e:
+        forget_vcp(code)
+        return jsonify({
+            "status": "error",
+            "message": f"Failed to set VCP feature {code}: {e}"
+        }), 500
+    remember_vcp(code, value)
+
+    return jsonify({
+        "status": "success",
+        "code": code,
+        "name": VCP_FEATURE_NAMES.get(code),
+        "value": value
+    }), 200
 
-    # Get the new brightness value to confirm
-    brightness, get_error = get_brightness()
+
+@app.route('/operations/<operation_id>', methods=['GET'])
+def operation_status(operation_id):
+    """Get the status of a background operation (?wait=<seconds> to block until done)"""
+    operation = operations.get(operation_id)
+
+    if operation is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Unknown operation {operation_id}"
+        }), 404
+
+    try:
+        wait = min(float(request.args.get("wait", 0)), OPERATION_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    if wait > 0:
+        operation.done.wait(wait)
 
     return jsonify({
         "status": "success",
-        "message": f"Brightness set to {value}",
-        "brightness": brightness if not get_error else value
+        "operation": operation.to_dict()
+    }), 200
+
+
+@app.route('/wake/stats', methods=['GET'])
+def wake_stats():
+    """Get the learned wake latency distribution"""
+    return jsonify({
+        "status": "success",
+        "wake_latency": wake_latency.stats()
+    }), 200
+
+
+@app.route('/sleepwatch', methods=['GET'])
+def sleepwatch_status():
+    """Get the Posterr sleep watcher's state and counters"""
+    return jsonify({
+        "status": "success",
+        "sleepwatch": sleep_watcher.status()
     }), 200
 
 
@@ -1146,16 +4904,102 @@ def watchdog_status():
 
 @app.route('/watchdog/log', methods=['GET'])
 def watchdog_log():
-    """Get recent watchdog log entries"""
-    log_entries = get_watchdog_log(num_lines=20)
+    """Get recent watchdog log entries (?lines=N, ?before=<cursor> for older pages)"""
+    try:
+        num_lines = int(request.args.get("lines", 20))
+        before = request.args.get("before")
+        before = int(before) if before is not None else None
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "lines and before must be integers"
+        }), 400
+
+    num_lines = max(1, min(num_lines, WATCHDOG_LOG_MAX_LINES))
+    log_entries, cursor = get_watchdog_log(num_lines=num_lines, before=before)
 
     return jsonify({
         "status": "success",
-        "entries": log_entries
+        "entries": log_entries,
+        "cursor": cursor
     }), 200
 
 
+class InFlightRequests:
+    """WSGI middleware that counts responses still being sent, so shutdown can wait for them"""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self.cond = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self.cond:
+            self.count += 1
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        # The server closes the body once the last byte is written (or the client left)
+        return ClosingIterator(body, self._finished)
+
+    def _finished(self):
+        with self.cond:
+            self.count -= 1
+            self.cond.notify_all()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight requests; returns how many remain"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.count and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return self.count
+
+
+def serve():
+    """Run the app on waitress until SIGTERM or SIGINT, then drain in-flight requests"""
+    in_flight = InFlightRequests(app)
+    server = waitress.create_server(
+        in_flight, host=HTTP_HOST, port=HTTP_PORT, threads=HTTP_THREADS,
+        channel_timeout=HTTP_IDLE_TIMEOUT, ident="monitor-http-server"
+    )
+    stop = threading.Event()
+
+    def request_shutdown(signum, frame):
+        print(f"Received signal {signum}, shutting down")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    # The event loop runs on its own thread so this one is free to drain it
+    threading.Thread(target=server.run, name="http", daemon=True).start()
+    print(f"Serving on http://{HTTP_HOST}:{HTTP_PORT} with {HTTP_THREADS} threads")
+    stop.wait()
+
+    # Stop accepting, end event streams, then let in-flight requests finish
+    server.accepting = False
+    server.pull_trigger()
+    sleep_watcher.stop()
+    if mqtt_bridge.active():
+        mqtt_bridge.stop()
+    for sender in webhooks:
+        sender.stop()
+    events.close()
+    remaining = in_flight.drain(HTTP_SHUTDOWN_GRACE)
+    if remaining:
+        print(f"Warning: {remaining} requests still running after {HTTP_SHUTDOWN_GRACE}s")
+    # Last, so writes that finished during the drain are journaled
+    state_journal.close()
+
+
 if __name__ == '__main__':
-    # Listen on all interfaces, port 5000
-    # debug=False for production use
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    if HTTP_SERVER == "flask":
+        # Flask development server, for debugging only
+        app.run(host=HTTP_HOST, port=HTTP_PORT, debug=False, threaded=True)
+    elif waitress is None:
+        sys.exit("waitress is not installed: apt install python3-waitress, or set MONITOR_HTTP_SERVER=flask")
+    else:
+        serve()
@@ -1,6 +1,7 @@
 #!/bin/bash
 
-# Uninstallation script for Posterr Sleep Monitor with DDC/CI
+# Uninstallation script for the old standalone Posterr Sleep Monitor
+# The sleep watcher now runs inside monitor-http-server.py (see GET /sleepwatch)
 
 set -e
 
@@ -41,5 +42,6 @@ echo "Uninstallation complete!"
 echo "=========================================="
 echo ""
 echo "Note: ddcutil and I2C settings were left unchanged."
+echo "Sleep/wake following Posterr continues in monitor-http-server (MONITOR_POSTERR_URL)."
 echo "The manual monitor control scripts (monitor-on.sh, monitor-off.sh) were not removed."
 echo ""